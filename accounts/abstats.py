@@ -0,0 +1,186 @@
+"""
+A/B test statistics computed with NumPy from the hourly rollups.
+
+Conversion is clicks per page view. Each variant gets its rate with a 95%
+Wilson interval, and every other variant is compared with the control using
+a two-proportion z-test. It also gets an always-valid p-value from a mixture
+sequential probability ratio test (mSPRT) evaluated after every hourly bucket,
+so peeking at the dashboard doesn't inflate the false-positive rate.
+
+Only ``ABTestRollup`` rows are read, so the cost depends on the number of
+hours the experiment has run and not on the number of raw events.
+"""
+
+import math
+
+import numpy as np
+
+from .models import ABTestRollup
+
+Z_95 = 1.959963984540054
+
+# Prior variance of the true difference in rates for the mSPRT mixture
+# (a standard deviation of one percentage point)
+MSPRT_TAU2 = 0.01**2
+
+CONTROL_VARIANT = "A"
+
+_erfc = np.vectorize(math.erfc, otypes=[float])
+
+
+def load_rollups(since=None):
+    """Return ``(variant, bucket, page_views, clicks)`` rows in bucket order."""
+    rollups = ABTestRollup.objects.order_by("bucket", "variant")
+    if since is not None:
+        rollups = rollups.filter(bucket__gte=since)
+    return list(rollups.values_list("variant", "bucket", "page_views", "clicks"))
+
+
+def build_matrices(rows):
+    """
+    Pivot rollup rows into ``variants x buckets`` arrays.
+
+    Returns ``(variants, buckets, views, clicks)``.
+    """
+    if not rows:
+        return [], [], np.zeros((0, 0)), np.zeros((0, 0))
+    variant_col, bucket_col, view_col, click_col = zip(*rows)
+    variants, variant_idx = np.unique(np.array(variant_col), return_inverse=True)
+    buckets, bucket_idx = np.unique(np.array(bucket_col), return_inverse=True)
+
+    views = np.zeros((len(variants), len(buckets)))
+    clicks = np.zeros((len(variants), len(buckets)))
+    np.add.at(views, (variant_idx, bucket_idx), view_col)
+    np.add.at(clicks, (variant_idx, bucket_idx), click_col)
+    return list(variants), list(buckets), views, clicks
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    """Vectorised Wilson score interval; ``(nan, nan)`` where trials is 0."""
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = successes / trials
+        denominator = 1 + z**2 / trials
+        centre = (p + z**2 / (2 * trials)) / denominator
+        margin = (
+            z * np.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denominator
+        )
+    return centre - margin, centre + margin
+
+
+def _difference(x_control, n_control, x_variant, n_variant):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_control = x_control / n_control
+        p_variant = x_variant / n_variant
+        variance = (
+            p_control * (1 - p_control) / n_control
+            + p_variant * (1 - p_variant) / n_variant
+        )
+    return p_variant - p_control, variance
+
+
+def two_proportion_test(x_control, n_control, x_variant, n_variant):
+    """Return ``(difference, standard_error, z, two_sided_p)`` arrays."""
+    diff, variance = _difference(x_control, n_control, x_variant, n_variant)
+    se = np.sqrt(variance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(se > 0, diff / se, 0.0)
+    p_value = _erfc(np.abs(z) / math.sqrt(2))
+    return diff, se, z, p_value
+
+
+def msprt_p_values(x_control, n_control, x_variant, n_variant, tau2=MSPRT_TAU2):
+    """
+    Always-valid p-values after each bucket from per-bucket counts.
+
+    Uses the normal-mixture mSPRT of Johari et al.: with ``V`` the variance of
+    the observed difference ``d`` so far,
+    ``L = sqrt(V / (V + tau2)) * exp(tau2 * d**2 / (2 * V * (V + tau2)))`` and
+    ``p`` is the running minimum of ``1 / L``.
+    """
+    diff, variance = _difference(
+        np.cumsum(x_control),
+        np.cumsum(n_control),
+        np.cumsum(x_variant),
+        np.cumsum(n_variant),
+    )
+    valid = np.isfinite(variance) & (variance > 0)
+    variance = np.where(valid, variance, 1.0)
+    diff = np.where(valid, diff, 0.0)
+    log_likelihood = 0.5 * np.log(variance / (variance + tau2)) + (
+        tau2 * diff**2 / (2 * variance * (variance + tau2))
+    )
+    log_likelihood = np.where(valid, log_likelihood, 0.0)
+    return np.minimum.accumulate(np.minimum(1.0, np.exp(-log_likelihood)))
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def compute_results(rows, control=CONTROL_VARIANT):
+    """
+    Summarise rollup rows into per-variant statistics.
+
+    Returns ``{"variants": [...], "buckets": n, "first_bucket", "last_bucket"}``.
+    Each variant dict has ``page_views``, ``clicks``, ``rate``, ``ci_low`` and
+    ``ci_high``. Non-control variants also have ``difference``, ``diff_ci_low``,
+    ``diff_ci_high``, ``lift``, ``z``, ``p_value`` and ``sequential_p_value``.
+    """
+    variants, buckets, views, clicks = build_matrices(rows)
+    # Repeat clicks can outnumber views; a rate can't exceed 100%
+    conversions = np.minimum(clicks, views)
+    total_views = views.sum(axis=1)
+    total_conversions = conversions.sum(axis=1)
+    ci_low, ci_high = wilson_interval(total_conversions, total_views)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = total_conversions / total_views
+
+    control_idx = variants.index(control) if control in variants else 0
+    summaries = []
+    for i, variant in enumerate(variants):
+        summary = {
+            "variant": variant,
+            "is_control": i == control_idx,
+            "page_views": int(total_views[i]),
+            "clicks": int(clicks[i].sum()),
+            "rate": _number(rates[i]),
+            "ci_low": _number(ci_low[i]),
+            "ci_high": _number(ci_high[i]),
+        }
+        if i != control_idx:
+            diff, se, z, p_value = two_proportion_test(
+                total_conversions[control_idx],
+                total_views[control_idx],
+                total_conversions[i],
+                total_views[i],
+            )
+            sequential = msprt_p_values(
+                conversions[control_idx], views[control_idx], conversions[i], views[i]
+            )
+            control_rate = rates[control_idx]
+            summary.update(
+                {
+                    "difference": _number(diff),
+                    "diff_ci_low": _number(diff - Z_95 * se),
+                    "diff_ci_high": _number(diff + Z_95 * se),
+                    "lift": (
+                        _number(diff / control_rate) if control_rate > 0 else None
+                    ),
+                    "z": _number(z),
+                    "p_value": _number(p_value),
+                    "sequential_p_value": (
+                        _number(sequential[-1]) if len(sequential) else None
+                    ),
+                }
+            )
+        summaries.append(summary)
+
+    return {
+        "variants": summaries,
+        "buckets": len(buckets),
+        "first_bucket": buckets[0] if buckets else None,
+        "last_bucket": buckets[-1] if buckets else None,
+    }
@@ -0,0 +1,274 @@
+"""
+A/B test variant assignment, page-view tracking and hourly rollups.
+
+Visitors are assigned a variant by hashing a long-lived ``ab_visitor`` cookie
+(seeded from their IP and user agent) with ``AB_TEST_SALT`` onto the weighted
+``AB_TEST_SPLIT``, so a visitor keeps their variant across requests and
+workers. The page does not depend on anything else in the request, so each
+variant's HTML is rendered once and served from the cache to anonymous
+visitors.
+
+Every view is folded into an in-process HyperLogLog sketch per variant and
+day, keyed by a hash of the visitor's IP and user agent. The sketches are
+merged into ``ABTestVisitorSketch`` rows every ``AB_SKETCH_FLUSH_INTERVAL``
+seconds and when a gunicorn worker exits. Merging is a register-wise max, so
+flushes from many workers combine correctly. With ``AB_PAGEVIEW_DEDUP_WINDOW`` set, a raw
+``ABTestPageView`` row is only written for a visitor's first view of a variant
+in each window.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncHour
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.utils import timezone
+
+from . import metrics
+from .models import ABTestButtonClick, ABTestPageView, ABTestRollup, ABTestVisitorSketch
+from .sketches import HyperLogLog, hash64
+from .utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+VISITOR_COOKIE = "ab_visitor"
+VISITOR_COOKIE_AGE = 365 * 24 * 60 * 60
+PAGE_KEY = "accounts:abtest-page:{variant}:{version}"
+PAGE_TEMPLATE = "accounts/abtest.html"
+# Static files referenced by the page; their (hashed) URLs version the cache
+PAGE_ASSETS = ("css/base.css", "css/abtest.css", "js/abtest.js")
+
+TEAM_NICKNAMES = [
+    "enthusiastic-partridge",
+    "sparkling-raccoon",
+    "aggressive-grouse",
+    "happy-stingray",
+]
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def parse_split(value):
+    """
+    Turn ``"A:50,B:30,C:20"`` into ``{"A": 50, "B": 30, "C": 20}``.
+
+    Every variant must be in ``AB_TEST_VARIANTS``. A weight of 0 stops new
+    assignments to a variant while still accepting its clicks.
+    """
+    split = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        variant, _, weight = part.partition(":")
+        variant = variant.strip()
+        if variant not in settings.AB_TEST_VARIANTS:
+            raise ImproperlyConfigured(
+                f"AB_TEST_SPLIT has unknown variant {variant!r}."
+            )
+        try:
+            split[variant] = int(weight)
+        except ValueError as exc:
+            raise ImproperlyConfigured(
+                f"AB_TEST_SPLIT weight for {variant!r} must be an integer."
+            ) from exc
+    if sum(split.values()) <= 0:
+        raise ImproperlyConfigured("AB_TEST_SPLIT needs at least one positive weight.")
+    return split
+
+
+def assign_variant(visitor, split=None):
+    """Map a visitor key onto a variant, the same way on every worker."""
+    if split is None:
+        split = parse_split(settings.AB_TEST_SPLIT)
+    bounds = list(accumulate(split.values()))
+    point = hash64(f"{settings.AB_TEST_SALT}:{visitor}") % bounds[-1]
+    return list(split)[bisect_right(bounds, point)]
+
+
+def visitor_key(request):
+    """
+    Return ``(key, is_new)`` for the visitor's assignment cookie.
+
+    A visitor without the cookie gets a key derived from their IP and user
+    agent, so clients that drop cookies still see a stable variant.
+    """
+    key = request.COOKIES.get(VISITOR_COOKIE, "")
+    if 8 <= len(key) <= 64 and key.isalnum():
+        return key, False
+    return f"{hash64(visitor_id(request)):016x}", True
+
+
+def _page_version(variant):
+    parts = [settings.AB_TEST_VARIANTS[variant]]
+    parts.extend(static(path) for path in PAGE_ASSETS)
+    return f"{hash64('|'.join(parts)):016x}"
+
+
+def render_variant_page(variant):
+    """Render the anonymous A/B page for ``variant``."""
+    context = {
+        "team_nicknames": TEAM_NICKNAMES,
+        "button_text": settings.AB_TEST_VARIANTS[variant],
+        "variant": variant,
+    }
+    return render_to_string(PAGE_TEMPLATE, context)
+
+
+def get_variant_page(variant):
+    """Return the cached anonymous A/B page for ``variant``, rendering on a miss."""
+    key = PAGE_KEY.format(variant=variant, version=_page_version(variant))
+    html = cache.get(key)
+    metrics.record_cache_lookup("abtest-page", html is not None)
+    if html is None:
+        html = render_variant_page(variant)
+        cache.set(key, html, timeout=settings.AB_PAGE_CACHE_TIMEOUT)
+    return html
+
+
+def log_event(event, variant):
+    """Log one A/B event (sampled by LOG_SAMPLE_RATES in settings)."""
+    logger.info("A/B %s", event, extra={"event": event, "variant": variant})
+
+
+def visitor_id(request):
+    """A stable, anonymous id for the visitor behind a request."""
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+    ua_hash = hashlib.blake2b(user_agent.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{get_client_ip(request)}|{ua_hash}"
+
+
+def record_page_view(request, variant):
+    """Count a page view in the sketches and, unless deduplicated, store it."""
+    metrics.AB_PAGE_VIEWS.labels(variant).inc()
+    log_event("page view", variant)
+    visitor = visitor_id(request)
+    key = (variant, timezone.now().date())
+    with _pending_lock:
+        sketch = _pending.get(key)
+        if sketch is None:
+            sketch = _pending[key] = HyperLogLog()
+        sketch.add_hash(hash64(visitor))
+    maybe_flush_sketches()
+
+    window = settings.AB_PAGEVIEW_DEDUP_WINDOW
+    if window:
+        seen_key = f"abtest:seen:{variant}:{hash64(visitor)}"
+        if not cache.add(seen_key, 1, timeout=window):
+            return None
+
+    return ABTestPageView.objects.create(
+        variant=variant,
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+    )
+
+
+def maybe_flush_sketches():
+    """Flush pending sketches if the flush interval has passed."""
+    if time.monotonic() - _last_flush >= settings.AB_SKETCH_FLUSH_INTERVAL:
+        flush_sketches()
+
+
+def flush_sketches():
+    """Merge every pending in-process sketch into its database row."""
+    global _last_flush  # pylint: disable=global-statement
+
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    for (variant, day), sketch in pending.items():
+        with transaction.atomic():
+            (
+                row,
+                created,
+            ) = ABTestVisitorSketch.objects.select_for_update().get_or_create(
+                variant=variant,
+                day=day,
+                defaults={"registers": sketch.to_bytes()},
+            )
+            if not created:
+                stored = HyperLogLog.from_bytes(bytes(row.registers))
+                stored.merge(sketch)
+                row.registers = stored.to_bytes()
+                row.save(update_fields=["registers", "updated_at"])
+    return len(pending)
+
+
+def unique_visitors(variant, since=None, until=None):
+    """
+    Estimate distinct visitors to ``variant`` between two dates (inclusive).
+
+    Merges the persisted daily sketches, so a visitor seen on several days is
+    still counted once.
+    """
+    rows = ABTestVisitorSketch.objects.filter(variant=variant)
+    if since is not None:
+        rows = rows.filter(day__gte=since)
+    if until is not None:
+        rows = rows.filter(day__lte=until)
+
+    total = HyperLogLog()
+    for registers in rows.values_list("registers", flat=True):
+        total.merge(HyperLogLog.from_bytes(bytes(registers)))
+    return total.count()
+
+
+def flush_sketches_at_exit():
+    """Flush before a worker exits; called from gunicorn's worker_exit hook."""
+    try:
+        flush_sketches()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not flush A/B visitor sketches at exit")
+
+
+def rollup_events(since=None):
+    """
+    Fold raw page views and clicks into hourly ``ABTestRollup`` rows.
+
+    Every bucket from ``since`` onwards is recomputed from the raw tables and
+    upserted. By default that is the latest bucket already rolled up (it may
+    have been partial), so repeated runs only touch the last hour or so.
+    Returns the number of rollup rows written.
+    """
+    if since is None:
+        since = ABTestRollup.objects.aggregate(latest=Max("bucket"))["latest"]
+
+    counts = defaultdict(lambda: {"page_views": 0, "clicks": 0})
+    for model, field in ((ABTestPageView, "page_views"), (ABTestButtonClick, "clicks")):
+        events = model.objects.all()
+        if since is not None:
+            events = events.filter(created_at__gte=since)
+        rows = (
+            events.annotate(bucket=TruncHour("created_at"))
+            .values("variant", "bucket")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            counts[(row["variant"], row["bucket"])][field] = row["total"]
+
+    ABTestRollup.objects.bulk_create(
+        [
+            ABTestRollup(variant=variant, bucket=bucket, **totals)
+            for (variant, bucket), totals in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["variant", "bucket"],
+        update_fields=["page_views", "clicks"],
+    )
+    return len(counts)
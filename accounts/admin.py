@@ -1,10 +1,65 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from .models import ABTestButtonClick, ABTestPageView, Dislike, Like, Post
+from .models import (
+    ABTestButtonClick,
+    ABTestPageView,
+    ABTestVisitorSketch,
+    Comment,
+    Dislike,
+    Follow,
+    Like,
+    Post,
+    PostTag,
+    SimilarPost,
+    Tag,
+)
+from .queries import reaction_count
+from .sketches import HyperLogLog
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that estimates the total for large unfiltered PostgreSQL tables.
+
+    An exact ``COUNT(*)`` scans the whole table. When the changelist has no
+    filters or search and the planner's row estimate (summed over partitions)
+    is at least ``ADMIN_ESTIMATED_COUNT_THRESHOLD``, that estimate is used.
+    Small tables, filtered lists and other databases get the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        conn = connections[queryset.db]
+        if conn.vendor == "postgresql" and not queryset.query.where:
+            table = queryset.model._meta.db_table
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) FROM pg_class c "
+                    "WHERE c.oid = %s::regclass OR c.oid IN "
+                    "(SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                    [table, table],
+                )
+                estimate = int(cursor.fetchone()[0])
+            if estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that can grow to millions of rows."""
+
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = [
         "title",
         "author",
@@ -14,47 +69,137 @@ class PostAdmin(admin.ModelAdmin):
         "get_dislike_count",
     ]
     list_filter = ["created_at", "author"]
-    search_fields = ["title", "description", "author__username"]
+    list_select_related = ["author"]
+    # Plain field lookups are backed by trigram indexes on PostgreSQL (0007)
+    search_fields = ["title", "description", "=author__username"]
     readonly_fields = ["created_at"]
 
-    def get_like_count(self, obj):
-        return obj.get_like_count()
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                like_count=reaction_count(Like),
+                dislike_count=reaction_count(Dislike),
+            )
+        )
 
-    get_like_count.short_description = "Likes"
+    @admin.display(description="Likes", ordering="like_count")
+    def get_like_count(self, obj):
+        return obj.like_count
 
+    @admin.display(description="Dislikes", ordering="dislike_count")
     def get_dislike_count(self, obj):
-        return obj.get_dislike_count()
-
-    get_dislike_count.short_description = "Dislikes"
+        return obj.dislike_count
 
 
 @admin.register(Like)
-class LikeAdmin(admin.ModelAdmin):
+class LikeAdmin(LargeTableAdmin):
     list_display = ["user", "post", "created_at"]
+    list_select_related = ["user", "post__author"]
     list_filter = ["created_at"]
-    search_fields = ["user__username", "post__title"]
+    search_fields = ["=user__username", "post__title"]
 
 
 @admin.register(Dislike)
-class DislikeAdmin(admin.ModelAdmin):
+class DislikeAdmin(LargeTableAdmin):
     list_display = ["user", "post", "created_at"]
+    list_select_related = ["user", "post__author"]
+    list_filter = ["created_at"]
+    search_fields = ["=user__username", "post__title"]
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ["__str__", "author", "depth", "created_at"]
+    list_select_related = ["author"]
     list_filter = ["created_at"]
-    search_fields = ["user__username", "post__title"]
+    search_fields = ["=author__username", "=post__id"]
+    raw_id_fields = ["post", "author", "parent"]
+    readonly_fields = ["path", "depth", "created_at"]
+
+    def has_add_permission(self, request):
+        # Paths are assigned by comments.add_comment, which the form bypasses
+        return False
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ["name", "post_count", "total_hours"]
+    search_fields = ["name"]
+    ordering = ["-post_count"]
+    # Running totals kept by signals; rebuild_tag_stats corrects them
+    readonly_fields = ["post_count", "total_hours"]
+
+
+@admin.register(PostTag)
+class PostTagAdmin(LargeTableAdmin):
+    list_display = ["tag", "post", "author", "like_count", "created_at"]
+    list_select_related = ["tag", "post", "author"]
+    search_fields = ["=tag__name", "=post__id"]
+    raw_id_fields = ["post", "tag", "author"]
+    # Copied from the post and its reactions, not edited here
+    readonly_fields = [
+        "author",
+        "hours_procrastinated",
+        "created_at",
+        "like_count",
+        "dislike_count",
+    ]
+
+
+@admin.register(SimilarPost)
+class SimilarPostAdmin(LargeTableAdmin):
+    list_display = ["post", "similar", "score"]
+    list_select_related = ["post", "similar"]
+    search_fields = ["=post__id"]
+    raw_id_fields = ["post", "similar"]
+    ordering = ["post", "-score"]
+
+    def has_add_permission(self, request):
+        # Written by similarity.py from the posts' vectors
+        return False
+
+
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
+    list_display = ["follower", "followee", "created_at"]
+    list_select_related = ["follower", "followee"]
+    search_fields = ["=follower__username", "=followee__username"]
 
 
 @admin.register(ABTestPageView)
-class ABTestPageViewAdmin(admin.ModelAdmin):
+class ABTestPageViewAdmin(LargeTableAdmin):
     list_display = ["variant", "ip_address", "created_at"]
     list_filter = ["variant", "created_at"]
-    search_fields = ["ip_address"]
+    # Exact matches only; a substring search can't use an index
+    search_fields = ["=ip_address"]
     readonly_fields = ["created_at"]
-    date_hierarchy = "created_at"
+    # No date_hierarchy: it runs a DISTINCT over every row's date. The
+    # created_at filter's ranges prune to the matching partitions instead.
+    ordering = ["-created_at"]
 
 
 @admin.register(ABTestButtonClick)
-class ABTestButtonClickAdmin(admin.ModelAdmin):
+class ABTestButtonClickAdmin(LargeTableAdmin):
     list_display = ["variant", "ip_address", "created_at"]
     list_filter = ["variant", "created_at"]
-    search_fields = ["ip_address"]
+    # Exact matches only; a substring search can't use an index
+    search_fields = ["=ip_address"]
     readonly_fields = ["created_at"]
-    date_hierarchy = "created_at"
+    # No date_hierarchy: it runs a DISTINCT over every row's date. The
+    # created_at filter's ranges prune to the matching partitions instead.
+    ordering = ["-created_at"]
+
+
+@admin.register(ABTestVisitorSketch)
+class ABTestVisitorSketchAdmin(admin.ModelAdmin):
+    list_display = ["variant", "day", "get_unique_visitors", "updated_at"]
+    list_filter = ["variant"]
+    exclude = ["registers"]
+    readonly_fields = ["variant", "day", "get_unique_visitors", "updated_at"]
+
+    def get_unique_visitors(self, obj):
+        return HyperLogLog.from_bytes(bytes(obj.registers)).count()
+
+    get_unique_visitors.short_description = "Unique visitors (est.)"
@@ -0,0 +1,147 @@
+"""
+Admission control: per-route concurrency limits and priority load shedding.
+
+Each worker process admits at most ``ADMISSION_MAX_CONCURRENCY`` requests at
+once. That should match the threads gunicorn gives each worker
+(``GUNICORN_THREADS``). Requests are ranked by URL name:
+
+- ``critical`` views (logins, reactions, posting) may use every slot.
+- ``normal`` views may use all but ``ADMISSION_RESERVED_SLOTS``, which stay
+  free for critical ones.
+- ``low`` views (feed polling) may only use ``ADMISSION_LOW_PRIORITY_SHARE``
+  of the slots, and never wait.
+
+Routes listed in ``ADMISSION_ROUTE_LIMITS`` also have their own cap, so slow
+leaderboard aggregations can't occupy every thread. A request that doesn't
+fit waits up to ``ADMISSION_QUEUE_TIMEOUT_MS`` for a slot. After that it gets
+a 503 with ``Retry-After``, which is much cheaper than timing out in the
+gunicorn queue. The current state is exported to ``/metrics``.
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from . import metrics
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+
+
+def parse_route_limits(value):
+    """Turn ``"leaderboard=2,user_leaderboard=2"`` into a dict."""
+    limits = {}
+    for part in value.split(","):
+        name, _, limit = part.partition("=")
+        if name.strip():
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+def priority_for(view):
+    if view in settings.ADMISSION_CRITICAL_VIEWS:
+        return CRITICAL
+    if view in settings.ADMISSION_LOW_PRIORITY_VIEWS:
+        return LOW
+    return NORMAL
+
+
+class AdmissionController:
+    """Per-process admission state, shared by all of a worker's threads."""
+
+    def __init__(
+        self,
+        max_concurrency,
+        reserved_slots=1,
+        low_priority_share=0.5,
+        route_limits=None,
+        queue_timeout=0.5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.capacity = {
+            CRITICAL: max_concurrency,
+            NORMAL: max(max_concurrency - reserved_slots, 1),
+            LOW: max(math.floor(max_concurrency * low_priority_share), 1),
+        }
+        self.route_limits = route_limits or {}
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.by_route = Counter()
+        self.waiting = Counter()
+        self.shed = Counter()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.ADMISSION_MAX_CONCURRENCY,
+            reserved_slots=settings.ADMISSION_RESERVED_SLOTS,
+            low_priority_share=settings.ADMISSION_LOW_PRIORITY_SHARE,
+            route_limits=parse_route_limits(settings.ADMISSION_ROUTE_LIMITS),
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        )
+
+    def _blocker(self, view, priority):
+        """Why the request can't start now, or None if it can."""
+        if self.by_route[view] >= self.route_limits.get(view, math.inf):
+            return "route_limit"
+        if self.in_flight >= self.capacity[priority]:
+            return "saturated"
+        return None
+
+    def acquire(self, view, priority=NORMAL):
+        """
+        Take a slot for ``view``, waiting up to the queue timeout.
+
+        Returns None when admitted (call ``release`` afterwards), otherwise
+        the reason the request was shed.
+        """
+        timeout = 0 if priority == LOW else self.queue_timeout
+        with self._condition:
+            reason = self._blocker(view, priority)
+            if reason and timeout > 0:
+                deadline = time.monotonic() + timeout
+                self.waiting[view] += 1
+                metrics.ADMISSION_WAITING.labels(view).inc()
+                try:
+                    while reason:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                        reason = self._blocker(view, priority)
+                finally:
+                    self.waiting[view] -= 1
+                    metrics.ADMISSION_WAITING.labels(view).dec()
+            if reason:
+                self.shed[(view, reason)] += 1
+                metrics.ADMISSION_SHED.labels(view, priority, reason).inc()
+                return reason
+            self.in_flight += 1
+            self.by_route[view] += 1
+        metrics.ADMISSION_IN_FLIGHT.labels(view).inc()
+        return None
+
+    def release(self, view):
+        with self._condition:
+            self.in_flight -= 1
+            self.by_route[view] -= 1
+            self._condition.notify_all()
+        metrics.ADMISSION_IN_FLIGHT.labels(view).dec()
+
+    def snapshot(self):
+        """The current state, for dashboards and debugging."""
+        with self._condition:
+            return {
+                "in_flight": self.in_flight,
+                "capacity": dict(self.capacity),
+                "by_route": {k: v for k, v in self.by_route.items() if v},
+                "waiting": {k: v for k, v in self.waiting.items() if v},
+                "shed": {
+                    f"{view}:{reason}": n for (view, reason), n in self.shed.items()
+                },
+            }
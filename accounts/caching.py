@@ -0,0 +1,397 @@
+"""
+Read-through caches for the feed head, the leaderboards and the A/B totals.
+
+Feed and leaderboard entries record the generation number they were computed
+at. The number is bumped whenever a post or reaction changes (see
+``signals.py``), so writes never have to know which cached lists they affect.
+A/B click totals are kept as plain counters and incremented in place.
+
+The feed and leaderboards also stay usable when the database isn't. Each list
+keeps its last good result for ``SNAPSHOT_MAX_AGE`` seconds. Only one request
+at a time refreshes a list, under its view's ``STATEMENT_TIMEOUTS_MS``.
+Meanwhile, other requests get the previous result as it is, or wait for the
+first one if there is none yet. Only if the refresh errors or times out is the
+previous result served marked stale. A
+list that has only passed ``FEED_CACHE_TIMEOUT``, with no writes since, is
+still correct, so it is served as is and refreshed on a background thread.
+
+All of this relies on every worker seeing the same generation number and
+counters. With ``SNAPSHOT_CACHE`` off (the default for a per-process cache
+outside DEBUG) nothing here is cached, and each call reads the database.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Sum
+
+from . import abtesting, metrics, tags
+from .models import ABTestButtonClick, Post
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "accounts:generation"
+SNAPSHOT_KEY = "accounts:snapshot:{name}"
+REFRESH_LOCK_KEY = "accounts:refreshing:{name}"
+AB_CLICKS_KEY = "accounts:ab-clicks:{variant}"
+
+# Seconds between checks for a snapshot another request is computing
+COLD_POLL_INTERVAL = 0.05
+
+LEADERBOARD_SORTS = {
+    "likes": ("-like_count", "-created_at"),
+    "dislikes": ("-dislike_count", "-created_at"),
+    "time": ("-created_at",),
+}
+DEFAULT_LEADERBOARD_SORT = "likes"
+
+
+def get_generation():
+    """Return the current cache generation, seeding it if it was evicted."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a lost counter never reuses an old generation
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """Mark every cached feed and leaderboard as out of date."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+@dataclass
+class Snapshot:
+    """A cached list, and whether it is older than the latest writes."""
+
+    value: list
+    stale: bool = False
+    computed_at: float = None
+
+    @property
+    def stale_since(self):
+        """When a stale value was computed, for display; None if it is current."""
+        if not self.stale or self.computed_at is None:
+            return None
+        return datetime.fromtimestamp(self.computed_at, timezone.utc)
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """
+    Make queries in the block fail with a ``DatabaseError`` after
+    ``milliseconds`` (0 or None means no limit).
+
+    PostgreSQL enforces this per statement, inside a transaction for the
+    block. SQLite has no statement timeout, so there the whole block gets the
+    budget and is interrupted through a progress handler.
+    """
+    if not milliseconds or connection.vendor not in ("postgresql", "sqlite"):
+        yield
+    elif connection.vendor == "postgresql":
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [int(milliseconds)])
+            yield
+            with connection.cursor() as cursor:
+                # In a savepoint, SET LOCAL would outlive the block
+                cursor.execute("SET LOCAL statement_timeout TO DEFAULT")
+    else:
+        connection.ensure_connection()
+        deadline = time.monotonic() + milliseconds / 1000
+        raw = connection.connection
+        raw.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            yield
+        finally:
+            raw.set_progress_handler(None, 0)
+
+
+def _refresh(name, compute, view, generation):
+    with statement_timeout(settings.STATEMENT_TIMEOUTS_MS.get(view)):
+        value = compute()
+    cache.set(
+        SNAPSHOT_KEY.format(name=name),
+        {"generation": generation, "computed_at": time.time(), "value": value},
+        settings.SNAPSHOT_MAX_AGE,
+    )
+    return value
+
+
+def _refresh_in_background(name, compute, view, generation):
+    try:
+        _refresh(name, compute, view, generation)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Background refresh of %s failed", name, exc_info=True)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY.format(name=name))
+        # The thread had its own connection; don't leak it
+        connection.close()
+
+
+def _refresh_later(name, compute, view, generation):
+    threading.Thread(
+        target=_refresh_in_background,
+        args=(name, compute, view, generation),
+        daemon=True,
+    ).start()
+
+
+def _wait_for_snapshot(name, view):
+    """
+    Poll for a snapshot that another request is computing.
+
+    Waits at most the view's statement timeout (or one second), which bounds
+    how long that request's query can run. Returns None if nothing arrives.
+    """
+    timeout = (settings.STATEMENT_TIMEOUTS_MS.get(view) or 1000) / 1000
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL_INTERVAL)
+        entry = cache.get(SNAPSHOT_KEY.format(name=name))
+        if entry is not None:
+            return entry
+    return None
+
+
+def _cached(name, compute, view):
+    if not settings.SNAPSHOT_CACHE:
+        with statement_timeout(settings.STATEMENT_TIMEOUTS_MS.get(view)):
+            return Snapshot(compute(), computed_at=time.time())
+
+    generation = get_generation()
+    entry = cache.get(SNAPSHOT_KEY.format(name=name))
+    current = entry is not None and entry["generation"] == generation
+    fresh = current and time.time() - entry["computed_at"] < settings.FEED_CACHE_TIMEOUT
+    metrics.record_cache_lookup(name.partition(":")[0], fresh)
+    if fresh:
+        return Snapshot(entry["value"], computed_at=entry["computed_at"])
+
+    lock_key = REFRESH_LOCK_KEY.format(name=name)
+    if not cache.add(lock_key, 1, settings.SNAPSHOT_REFRESH_LOCK_TIMEOUT):
+        # Another request is already refreshing it. Its previous result is
+        # only a write or two behind, which isn't worth flagging.
+        if entry is None:
+            entry = _wait_for_snapshot(name, view)
+        if entry is not None:
+            return Snapshot(entry["value"], computed_at=entry["computed_at"])
+        # The refresh is slow or failed; compute our own rather than fail
+        return Snapshot(
+            _refresh(name, compute, view, generation), computed_at=time.time()
+        )
+
+    if current:
+        _refresh_later(name, compute, view, generation)
+        return Snapshot(entry["value"], computed_at=entry["computed_at"])
+    try:
+        return Snapshot(
+            _refresh(name, compute, view, generation), computed_at=time.time()
+        )
+    except DatabaseError:
+        if entry is None:
+            # Nothing to fall back on
+            raise
+        logger.warning("Serving a stale %s: refresh failed", name, exc_info=True)
+        metrics.STALE_SNAPSHOTS_SERVED.labels(name.partition(":")[0]).inc()
+        return Snapshot(entry["value"], stale=True, computed_at=entry["computed_at"])
+    finally:
+        cache.delete(lock_key)
+
+
+def annotated_posts():
+    """Posts with their like/dislike counts and author loaded in one query."""
+    return Post.objects.select_related("author").annotate(
+        like_count=Count("likes", distinct=True),
+        dislike_count=Count("dislikes", distinct=True),
+    )
+
+
+def get_feed_head(tag=None):
+    """
+    Return a ``Snapshot`` of the newest ``FEED_HEAD_SIZE`` posts, or of those
+    tagged ``tag``.
+    """
+    if tag:
+        return _cached(
+            f"feed:{tag}",
+            lambda: tags.get_tag_feed(tag, settings.FEED_HEAD_SIZE),
+            "home",
+        )
+    return _cached(
+        "feed",
+        lambda: list(
+            annotated_posts().order_by("-created_at", "-id")[: settings.FEED_HEAD_SIZE]
+        ),
+        "home",
+    )
+
+
+def get_post_leaderboard(sort_by, tag=None):
+    """
+    Return a ``Snapshot`` of the top ``LEADERBOARD_SIZE`` posts for a sort,
+    optionally only those tagged ``tag``.
+    """
+    if sort_by not in LEADERBOARD_SORTS:
+        sort_by = DEFAULT_LEADERBOARD_SORT
+    if tag:
+        return _cached(
+            f"leaderboard:{sort_by}:{tag}",
+            lambda: tags.get_tag_leaderboard(tag, sort_by, settings.LEADERBOARD_SIZE),
+            "leaderboard",
+        )
+    return _cached(
+        f"leaderboard:{sort_by}",
+        lambda: list(
+            annotated_posts().order_by(*LEADERBOARD_SORTS[sort_by])[
+                : settings.LEADERBOARD_SIZE
+            ]
+        ),
+        "leaderboard",
+    )
+
+
+def get_user_leaderboard(tag=None):
+    """
+    Return a ``Snapshot`` of the top ``LEADERBOARD_SIZE`` users by hours,
+    counting only posts tagged ``tag`` if it is given.
+    """
+    if tag:
+        return _cached(
+            f"user-leaderboard:{tag}",
+            lambda: tags.get_tag_user_leaderboard(tag, settings.LEADERBOARD_SIZE),
+            "user_leaderboard",
+        )
+    return _cached(
+        "user-leaderboard",
+        lambda: list(
+            User.objects.only("id", "username", "email")
+            .annotate(total_hours=Sum("posts__hours_procrastinated"))
+            .filter(total_hours__isnull=False)
+            .order_by("-total_hours")[: settings.LEADERBOARD_SIZE]
+        ),
+        "user_leaderboard",
+    )
+
+
+def get_top_tags():
+    """Return a ``Snapshot`` of the ``TOP_TAGS_SIZE`` tags with the most posts."""
+    return _cached("tags", tags.get_top_tags, "leaderboard")
+
+
+def _load_ab_click_totals():
+    totals = dict.fromkeys(settings.AB_TEST_VARIANTS, 0)
+    totals.update(
+        ABTestButtonClick.objects.values_list("variant")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    if not settings.SNAPSHOT_CACHE:
+        return totals
+    cache.set_many(
+        {AB_CLICKS_KEY.format(variant=v): n for v, n in totals.items()},
+        timeout=None,
+    )
+    return totals
+
+
+def get_ab_click_totals():
+    """Return ``{variant: click_count}``, loading from the DB on a miss."""
+    if not settings.SNAPSHOT_CACHE:
+        return _load_ab_click_totals()
+    keys = {AB_CLICKS_KEY.format(variant=v): v for v in settings.AB_TEST_VARIANTS}
+    cached = cache.get_many(keys)
+    metrics.record_cache_lookup("ab-clicks", len(cached) == len(keys))
+    if len(cached) == len(keys):
+        return {keys[key]: count for key, count in cached.items()}
+    return _load_ab_click_totals()
+
+
+def record_ab_click(variant):
+    """Count one click against a cached total, if the totals are cached."""
+    try:
+        cache.incr(AB_CLICKS_KEY.format(variant=variant))
+    except ValueError:
+        # Not cached yet; the next read loads the totals from the database
+        pass
+
+
+def _warm_tasks():
+    tasks = {}
+    if settings.SNAPSHOT_CACHE:
+        tasks.update(
+            {
+                "feed": get_feed_head,
+                "user-leaderboard": get_user_leaderboard,
+                "tags": get_top_tags,
+                "ab-clicks": _load_ab_click_totals,
+            }
+        )
+        for sort_by in LEADERBOARD_SORTS:
+            tasks[f"leaderboard:{sort_by}"] = lambda s=sort_by: get_post_leaderboard(s)
+    for variant in settings.AB_TEST_VARIANTS:
+        tasks[f"abtest-page:{variant}"] = lambda v=variant: abtesting.get_variant_page(
+            v
+        )
+    return tasks
+
+
+def _run_warm_task(name, task, threaded):
+    started = time.perf_counter()
+    try:
+        task()
+    finally:
+        if threaded:
+            # Worker threads get their own connection; don't leak it
+            connection.close()
+    elapsed = time.perf_counter() - started
+    logger.debug("Warmed cache %s in %.1f ms", name, elapsed * 1000)
+    return name, elapsed
+
+
+def warm_caches(concurrency=None):
+    """
+    Precompute every cached list so the first requests after a deploy are hits.
+
+    At most ``concurrency`` aggregate queries run at once (defaulting to
+    ``CACHE_WARM_CONCURRENCY``) so warming can't itself swamp the database.
+    Returns ``{cache_name: seconds}``.
+    """
+    if concurrency is None:
+        concurrency = settings.CACHE_WARM_CONCURRENCY
+    tasks = _warm_tasks()
+
+    if concurrency <= 1:
+        return dict(
+            _run_warm_task(name, task, threaded=False) for name, task in tasks.items()
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(_run_warm_task, name, task, True)
+            for name, task in tasks.items()
+        ]
+        return dict(future.result() for future in futures)
+
+
+def warm_caches_on_startup():
+    """Warm the caches at boot when ``WARM_CACHES_ON_STARTUP`` is enabled."""
+    if not settings.WARM_CACHES_ON_STARTUP:
+        return
+    try:
+        warm_caches()
+    except Exception:  # pylint: disable=broad-except
+        # A cold cache is only slower; never let warming stop a worker booting
+        logger.exception("Cache warming failed at startup")
@@ -0,0 +1,112 @@
+"""
+Threaded comments stored as materialised paths.
+
+A comment's ``path`` is its ancestors' ids and then its own, each
+zero-padded to ``SEGMENT_WIDTH`` digits, e.g. ``00000000070000000012`` for
+comment 12 replying to comment 7. Every segment has the same width and
+contains only digits, so sorting a post's comments by path gives every thread
+depth-first, with siblings oldest first, under any database collation. The
+replies below a comment are the comments whose path starts with its path.
+
+A page of a post's comments, or of one comment's subtree, is therefore a
+single range scan on the ``(post, path)`` index. Pages are cut by comment
+count and continue after the last path returned, so a page may end partway
+through a thread; ``parent_id`` and ``depth`` let clients attach the rest.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Subquery
+
+from .models import Comment, Post
+
+SEGMENT_WIDTH = 10
+_CURSOR = re.compile(r"^\d+$")
+
+
+def segment(pk):
+    return str(pk).zfill(SEGMENT_WIDTH)
+
+
+def validate_body(body):
+    """Return ``(body, error)``; ``error`` is None when the body is usable."""
+    body = body.strip() if isinstance(body, str) else body
+    if not body:
+        return body, "Comment is required."
+    if not isinstance(body, str):
+        return body, "Comment must be text."
+    if len(body) > settings.COMMENT_MAX_LENGTH:
+        return (
+            body,
+            f"Comment must be at most {settings.COMMENT_MAX_LENGTH} characters.",
+        )
+    return body, None
+
+
+def add_comment(post, author, body, parent=None):
+    """
+    Create a comment on ``post``, as a reply to ``parent`` if it is given.
+
+    The path needs the new row's id, so it is set by a second UPDATE in the
+    same transaction.
+    """
+    with transaction.atomic():
+        comment = Comment.objects.create(
+            post=post,
+            author=author,
+            parent=parent,
+            body=body,
+            depth=parent.depth + 1 if parent else 0,
+        )
+        comment.path = (parent.path if parent else "") + segment(comment.pk)
+        Comment.objects.filter(pk=comment.pk).update(path=comment.path)
+    return comment
+
+
+def _page(comments, cursor, page_size):
+    page_size = page_size or settings.COMMENT_PAGE_SIZE
+    if cursor and _CURSOR.match(cursor):
+        comments = comments.filter(path__gt=cursor)
+    comments = list(comments.select_related("author").order_by("path")[: page_size + 1])
+    next_cursor = comments[page_size - 1].path if len(comments) > page_size else None
+    return comments[:page_size], next_cursor
+
+
+def get_thread_page(post_id, cursor=None, page_size=None):
+    """
+    Return ``(comments, next_cursor)``: the post's comments, depth-first.
+
+    Malformed cursors are ignored and return the first page.
+    """
+    return _page(Comment.objects.filter(post_id=post_id), cursor, page_size)
+
+
+def get_subtree_page(post_id, root_id, cursor=None, page_size=None):
+    """
+    Return ``(comments, next_cursor)`` for a comment and its replies.
+
+    The root's path is looked up in a subquery, so this is still one query.
+    An unknown root, or one on another post, gives an empty page.
+    """
+    root_path = Comment.objects.filter(pk=root_id, post_id=post_id).values("path")
+    comments = Comment.objects.filter(
+        post_id=post_id, path__startswith=Subquery(root_path)
+    )
+    return _page(comments, cursor, page_size)
+
+
+def recount_comments(post_ids=None):
+    """Recompute ``Post.comment_count``; returns the number of posts changed."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    changed = 0
+    for post_id, stored, actual in posts.annotate(actual=Count("comments")).values_list(
+        "pk", "comment_count", "actual"
+    ):
+        if stored != actual:
+            Post.objects.filter(pk=post_id).update(comment_count=actual)
+            changed += 1
+    return changed
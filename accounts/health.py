@@ -0,0 +1,81 @@
+"""
+Liveness and readiness checks for load balancers and deploys.
+
+``/healthz`` only shows the process is up and serving; it touches nothing.
+``/readyz`` also checks that the database answers within
+``READINESS_DB_TIMEOUT_MS``, that every migration has been applied, and
+that the cache can be written and read back.
+
+Both are answered by ``HealthCheckMiddleware`` at the top of the middleware
+stack, so probes skip host validation, sessions, CSRF, URL resolution and
+templates. They are public, so a failed check is only reported as
+``"error"``; the exception, which can name hosts or driver details, goes to
+the log.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from .caching import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+LIVENESS_PATH = "/healthz"
+READINESS_PATH = "/readyz"
+CACHE_PROBE_KEY = "accounts:readyz"
+
+# Applied migrations stay applied, so once they are, stop loading the graph
+_migrations_applied = False
+
+
+def check_database():
+    with statement_timeout(settings.READINESS_DB_TIMEOUT_MS):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+
+
+def check_migrations():
+    global _migrations_applied  # pylint: disable=global-statement
+
+    if _migrations_applied:
+        return
+    executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f"{len(plan)} unapplied migrations")
+    _migrations_applied = True
+
+
+def check_cache():
+    cache.set(CACHE_PROBE_KEY, 1, 30)
+    if cache.get(CACHE_PROBE_KEY) != 1:
+        raise RuntimeError("cache write was not readable")
+
+
+CHECKS = {
+    "database": check_database,
+    "migrations": check_migrations,
+    "cache": check_cache,
+}
+
+
+def readiness():
+    """Run every check; return ``(ready, {name: "ok", "error" or "skipped"})``."""
+    results = {}
+    for name, check in CHECKS.items():
+        if name == "migrations" and results.get("database") != "ok":
+            results[name] = "skipped"
+            continue
+        try:
+            check()
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Readiness check %s failed", name, exc_info=True)
+            results[name] = "error"
+        else:
+            results[name] = "ok"
+    return all(result == "ok" for result in results.values()), results
@@ -0,0 +1,248 @@
+"""
+Bulk post import from JSON or NDJSON.
+
+Records are read from a stream one at a time and checked with the same rules
+as the create form (``validation.validate_post``). Valid rows are inserted
+with ``bulk_create`` in batches of ``POST_IMPORT_BATCH_SIZE``, each in its own
+transaction, so memory use doesn't depend on the size of the input. A record
+looks like::
+
+    {"title": "...", "description": "...", "hours_procrastinated": 2.5,
+     "author": "username", "created_at": "2024-01-31T12:00:00Z"}
+
+``author`` defaults to the importing user and ``created_at`` to now.
+Imported posts get their similar posts from the next scheduled
+``compute_similar_posts --missing`` run.
+"""
+
+import codecs
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, metrics, profiles, timelines
+from .models import Post
+from .validation import validate_post
+
+READ_CHUNK_SIZE = 64 * 1024
+# Per-row errors kept in the result; later failures are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFormatError(ValueError):
+    """The input isn't valid JSON or NDJSON; no further rows can be read."""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": messages})
+
+    def as_dict(self):
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+
+def iter_ndjson(stream):
+    """Yield one decoded value per non-blank line of ``stream``."""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except UnicodeDecodeError as exc:
+            raise ImportFormatError(f"Line {line_number}: not valid UTF-8.") from exc
+        except json.JSONDecodeError as exc:
+            raise ImportFormatError(f"Line {line_number}: {exc.msg}.") from exc
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the items of a top-level JSON array without loading it whole.
+
+    ``stream`` only needs a ``read(size)`` method returning str or bytes.
+    """
+    decoder = json.JSONDecoder()
+    # Decoded incrementally so multi-byte characters can span chunks
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        if isinstance(chunk, bytes):
+            try:
+                chunk = utf8.decode(chunk, final=eof)
+            except UnicodeDecodeError as exc:
+                raise ImportFormatError("Input is not valid UTF-8.") from exc
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != "[":
+        raise ImportFormatError("Expected a JSON array.")
+    position += 1
+
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ImportFormatError("Unexpected end of input.")
+        if buffer[position] == "]":
+            return
+        if started:
+            if buffer[position] != ",":
+                raise ImportFormatError("Expected ',' between array items.")
+            position += 1
+            skip_whitespace()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                if eof:
+                    raise ImportFormatError(f"Invalid JSON: {exc.msg}.") from exc
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                # A number may continue in the next chunk
+                fill()
+                continue
+            break
+        position = end
+        started = True
+        yield item
+
+
+def iter_records(stream, fmt):
+    """Yield records from ``stream`` in ``"json"`` or ``"ndjson"`` format."""
+    if fmt == "ndjson":
+        return iter_ndjson(stream)
+    if fmt == "json":
+        return iter_json_array(stream)
+    raise ImportFormatError(f"Unsupported format {fmt!r}.")
+
+
+def _build_post(record, author_ids, default_author):
+    if not isinstance(record, dict):
+        return None, ["Row must be a JSON object."]
+
+    cleaned, errors = validate_post(
+        record.get("title"),
+        record.get("description"),
+        record.get("hours_procrastinated"),
+    )
+
+    username = record.get("author")
+    if username is None:
+        author_id = default_author.pk if default_author else None
+        if author_id is None:
+            errors.append("Author is required.")
+    elif not isinstance(username, str):
+        errors.append("Author must be a username.")
+    else:
+        author_id = author_ids.get(username)
+        if author_id is None:
+            errors.append(f"Unknown author {username!r}.")
+
+    created_at = record.get("created_at")
+    if created_at is None:
+        created_at = timezone.now()
+    else:
+        parsed = parse_datetime(created_at) if isinstance(created_at, str) else None
+        if parsed is None:
+            errors.append("created_at must be an ISO 8601 datetime.")
+        elif timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        created_at = parsed
+
+    if errors:
+        return None, errors
+    return Post(author_id=author_id, created_at=created_at, **cleaned), []
+
+
+def _insert_batch(rows, default_author, result):
+    usernames = {
+        record["author"]
+        for _, record in rows
+        if isinstance(record, dict) and isinstance(record.get("author"), str)
+    }
+    author_ids = {}
+    if usernames:
+        author_ids = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "id")
+        )
+
+    posts = []
+    for row_number, record in rows:
+        post, errors = _build_post(record, author_ids, default_author)
+        if errors:
+            result.add_error(row_number, errors)
+        else:
+            posts.append(post)
+
+    if posts:
+        # bulk_create sends no signals, so update stats and timelines here.
+        # Similar posts are found by the scheduled compute_similar_posts
+        # --missing run, rather than scanning every vector per imported row.
+        totals = defaultdict(lambda: [0, Decimal("0")])
+        for post in posts:
+            totals[post.author_id][0] += 1
+            totals[post.author_id][1] += post.hours_procrastinated
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            for author_id, (count, hours) in totals.items():
+                profiles.adjust(author_id, post_count=count, total_hours=hours)
+            timelines.fan_out_posts(posts)
+        result.created += len(posts)
+        metrics.POSTS_CREATED.labels("import").inc(len(posts))
+
+
+def import_posts(records, default_author=None, batch_size=None):
+    """
+    Validate and insert ``records``, returning an ``ImportResult``.
+
+    Rows are numbered from 1. A bad row is reported and skipped without
+    affecting the others. An ``ImportFormatError`` from the record iterator
+    stops the import, and batches already inserted are kept.
+    """
+    batch_size = batch_size or settings.POST_IMPORT_BATCH_SIZE
+    result = ImportResult()
+    batch = []
+    try:
+        for row_number, record in enumerate(records, start=1):
+            batch.append((row_number, record))
+            if len(batch) >= batch_size:
+                _insert_batch(batch, default_author, result)
+                batch = []
+        if batch:
+            _insert_batch(batch, default_author, result)
+    finally:
+        if result.created:
+            # bulk_create sends no post_save, so invalidate the feeds here
+            caching.bump_generation()
+    return result
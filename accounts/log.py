@@ -0,0 +1,204 @@
+"""
+Non-blocking, structured logging.
+
+``QueueLogHandler`` puts records on a bounded in-memory queue and returns.
+A ``QueueListener`` thread writes them to stdout, so a slow log reader can
+no longer stall request threads. When the queue is full, records are
+dropped instead of waiting. Dropped records are counted on the handler and
+in the ``procrast_log_records_dropped`` metric. Once there is room again,
+a warning with the drop count is logged.
+
+``JsonFormatter`` writes one JSON object per line. ``RequestIdFilter``
+stamps every record with the id of the request that produced it (see
+``RequestIdMiddleware``). ``SamplingFilter`` keeps only a fraction of the
+INFO and DEBUG records from noisy loggers such as A/B tracking.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that aren't "extra" fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_sample_rates(value):
+    """Turn ``"accounts.abtesting=0.1,django.request=0.5"`` into a dict."""
+    rates = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    """Set ``record.request_id`` from the request being handled, if any."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only a fraction of the INFO and DEBUG records from given loggers.
+
+    ``rates`` maps a logger name (its children are included) to the fraction
+    to keep. Kept records carry ``sample_rate`` so counts can be scaled back
+    up. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        if isinstance(rates, str):
+            rates = parse_sample_rates(rates)
+        self.rates = rates or {}
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record, and any ``extra`` fields, as one line of JSON."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "process": record.process,
+            "thread": record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Queue records for a background listener that writes them to ``stream``.
+
+    At most ``maxsize`` records wait in memory; beyond that they are dropped.
+    The listener is started lazily in each process, so workers forked from
+    a gunicorn master that already configured logging get their own thread.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.dropped = 0
+        self._reported_drops = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, off the request path
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Keep the record whole for the formatter; only resolve the
+        # arguments and traceback, which may not survive until it runs
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # A listener inherited across fork has no thread; start over
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_RECORDS_DROPPED.inc()
+            return
+        if self.dropped != self._reported_drops:
+            missed = self.dropped - self._reported_drops
+            self._reported_drops = self.dropped
+            warning = logging.makeLogRecord(
+                {
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"Dropped {missed} log records: the log queue was full",
+                    "dropped": missed,
+                }
+            )
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                pass
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener.start()
+        self.target.flush()
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+        self.target.close()
+        super().close()
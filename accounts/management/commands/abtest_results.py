@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import abstats, abtesting
+
+
+def _fmt(value, pattern="{:.2%}"):
+    return "-" if value is None else pattern.format(value)
+
+
+class Command(BaseCommand):
+    help = "Roll up A/B test events and print conversion statistics per variant."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only include buckets from this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--skip-rollup",
+            action="store_true",
+            help="Report from the existing rollups without updating them first.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = timezone.make_aware(
+                    datetime.strptime(options["since"], "%Y-%m-%d")
+                )
+            except ValueError as exc:
+                raise CommandError("--since must be a date (YYYY-MM-DD).") from exc
+
+        if not options["skip_rollup"]:
+            written = abtesting.rollup_events()
+            self.stdout.write(f"Rolled up {written} hourly buckets.")
+
+        results = abstats.compute_results(abstats.load_rollups(since=since))
+        if not results["variants"]:
+            self.stdout.write("No A/B test data yet.")
+            return
+
+        self.stdout.write(
+            f"{results['buckets']} buckets from {results['first_bucket']:%Y-%m-%d %H:%M}"
+            f" to {results['last_bucket']:%Y-%m-%d %H:%M}"
+        )
+        self.stdout.write(
+            f"{'variant':<10}{'views':>10}{'clicks':>10}{'rate':>9}"
+            f"{'95% CI':>20}{'diff':>9}{'p':>9}{'seq p':>9}"
+        )
+        for row in results["variants"]:
+            ci = f"{_fmt(row['ci_low'])}-{_fmt(row['ci_high'])}"
+            label = row["variant"] + (" (ctl)" if row["is_control"] else "")
+            self.stdout.write(
+                f"{label:<10}{row['page_views']:>10}{row['clicks']:>10}"
+                f"{_fmt(row['rate']):>9}{ci:>20}"
+                f"{_fmt(row.get('difference')):>9}"
+                f"{_fmt(row.get('p_value'), '{:.4f}'):>9}"
+                f"{_fmt(row.get('sequential_p_value'), '{:.4f}'):>9}"
+            )
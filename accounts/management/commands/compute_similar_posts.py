@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.similarity import index_missing_posts, rebuild_similar_posts
+
+
+class Command(BaseCommand):
+    help = "Recompute every post's similar posts, or only index posts not yet indexed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            "--missing",
+            action="store_true",
+            dest="incremental",
+            help="Only index posts with no vector yet, e.g. bulk imports.",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=None,
+            help="Posts scored per matrix block in a full rebuild.",
+        )
+
+    def handle(self, *args, **options):
+        if options["incremental"]:
+            indexed = index_missing_posts()
+            self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} new posts."))
+            return
+
+        block_size = options["block_size"]
+        if block_size is not None and block_size < 1:
+            raise CommandError("--block-size must be at least 1.")
+        posts, links = rebuild_similar_posts(block_size=block_size)
+        self.stdout.write(
+            self.style.SUCCESS(f"Found {links} similar posts for {posts} posts.")
+        )
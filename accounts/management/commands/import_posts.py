@@ -0,0 +1,66 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importing import ImportFormatError, import_posts, iter_records
+
+
+class Command(BaseCommand):
+    help = "Bulk-import posts from a JSON array or NDJSON file ('-' for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["json", "ndjson"],
+            help="Input format (default: from the file extension, else ndjson).",
+        )
+        parser.add_argument(
+            "--author",
+            help="Username for records without an author.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows per insert batch (default: POST_IMPORT_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.endswith(".json") else "ndjson")
+
+        default_author = None
+        if options["author"]:
+            try:
+                default_author = User.objects.get(username=options["author"])
+            except User.DoesNotExist as exc:
+                raise CommandError(f"No user named {options['author']!r}.") from exc
+
+        started = time.perf_counter()
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            result = import_posts(
+                iter_records(stream, fmt),
+                default_author=default_author,
+                batch_size=options["batch_size"],
+            )
+        except ImportFormatError as exc:
+            raise CommandError(f"Import stopped: {exc}") from exc
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {' '.join(error['errors'])}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more")
+        rate = result.created / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created} posts ({result.failed} failed) "
+                f"in {elapsed:.2f}s, {rate:.0f} posts/s."
+            )
+        )
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.partitions import apply_retention, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions for the A/B event tables, then roll "
+        "up and remove events older than the retention period."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.EVENT_RETENTION_DAYS,
+            help="Keep raw events for this many days (0 keeps them forever).",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.EVENT_PARTITION_MONTHS_AHEAD,
+            help="Create partitions this many months ahead (PostgreSQL only).",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0 or options["months_ahead"] < 0:
+            raise CommandError("--days and --months-ahead can't be negative.")
+
+        for name in ensure_partitions(months_ahead=options["months_ahead"]):
+            self.stdout.write(f"Created partition {name}")
+
+        removed = apply_retention(days=options["days"])
+        for table, counts in removed.items():
+            self.stdout.write(
+                f"{table}: dropped {counts['partitions_dropped']} partitions, "
+                f"deleted {counts['rows_deleted']} rows"
+            )
+        self.stdout.write(self.style.SUCCESS("Event tables maintained."))
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print an X-Profile-Token header value for profiling live requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Staff user the token is issued to.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            username=options["username"], is_staff=True, is_active=True
+        ).first()
+        if user is None:
+            raise CommandError(f"{options['username']!r} is not an active staff user.")
+
+        token = make_token(user.username)
+        self.stdout.write(token)
+        self.stderr.write(
+            "Use it as: curl -H 'X-Profile-Token: <token>' "
+            "https://<host>/leaderboard/ -o profile.speedscope.json"
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.tags import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute tag totals and the post fields and reaction counts copied "
+        "into each post's tag rows."
+    )
+
+    def handle(self, *args, **options):
+        rebuild_tag_stats()
+        self.stdout.write(self.style.SUCCESS("Rebuilt tag stats."))
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.profiles import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed profile stats from posts and reactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Only rebuild these users (default: everyone).",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        count = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            rebuild_user_stats(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} users."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.comments import recount_comments
+
+
+class Command(BaseCommand):
+    help = "Recompute each post's denormalized comment count from its comments."
+
+    def handle(self, *args, **options):
+        changed = recount_comments()
+        self.stdout.write(self.style.SUCCESS(f"Corrected {changed} comment counts."))
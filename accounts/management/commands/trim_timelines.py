@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.timelines import trim_timelines
+
+
+class Command(BaseCommand):
+    help = "Trim every home timeline to its newest TIMELINE_MAX_LENGTH entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-length",
+            type=int,
+            default=settings.TIMELINE_MAX_LENGTH,
+            help="Entries to keep per timeline (default: TIMELINE_MAX_LENGTH).",
+        )
+
+    def handle(self, *args, **options):
+        deleted = trim_timelines(options["max_length"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} old timeline entries.")
+        )
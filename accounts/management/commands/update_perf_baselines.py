@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import perf
+
+DEFAULT_LABEL = "accounts.tests.PerformanceTests"
+
+
+class Command(BaseCommand):
+    help = "Run the performance tests and record their query counts and timings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "labels",
+            nargs="*",
+            help=(
+                "Test labels to re-record; other baselines are kept "
+                f"(default: all of {DEFAULT_LABEL})."
+            ),
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Run the tests this many times and keep the median timings.",
+        )
+
+    def handle(self, *args, **options):
+        labels = options["labels"] or [DEFAULT_LABEL]
+        if options["runs"] < 1:
+            raise CommandError("--runs must be at least 1.")
+
+        perf.start_recording()
+        try:
+            for _ in range(options["runs"]):
+                call_command("test", *labels, verbosity=options["verbosity"])
+        except SystemExit:
+            raise CommandError("Tests failed; baselines not updated.")
+        finally:
+            recorded = perf.stop_recording()
+
+        # A full run replaces the file so removed scenarios are dropped
+        baselines = perf.load_baselines() if options["labels"] else {}
+        baselines.update(recorded)
+        perf.save_baselines(baselines)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recorded {len(recorded)} baselines in {settings.PERF_BASELINE_FILE}."
+            )
+        )
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.caching import warm_caches
+
+
+class Command(BaseCommand):
+    help = "Precompute the feed, leaderboard and A/B caches before traffic arrives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.CACHE_WARM_CONCURRENCY,
+            help="Maximum number of warming queries to run at once.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if concurrency < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        if not settings.CACHE_IS_SHARED:
+            raise CommandError(
+                "The cache is per-process, so warming it here can't reach the "
+                "web workers. Set REDIS_URL or DATABASE_CACHE_TABLE, or use "
+                "WARM_CACHES_ON_STARTUP."
+            )
+
+        timings = warm_caches(concurrency=concurrency)
+        for name, elapsed in sorted(timings.items()):
+            self.stdout.write(f"{name}: {elapsed * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Warmed {len(timings)} caches."))
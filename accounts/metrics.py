@@ -0,0 +1,106 @@
+"""
+Prometheus metrics, served at ``/metrics``.
+
+Each gunicorn worker is its own process. When ``PROMETHEUS_MULTIPROC_DIR``
+is set (gunicorn.conf.py sets it), each worker writes its samples to
+memory-mapped files in that directory, and the endpoint adds them up across
+workers. Without it (runserver, tests) samples live in the process's
+default registry. Recording a sample is an in-memory update either way; it
+never touches the database or the cache.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Label for requests that never resolved to a URL name (404s, static files)
+UNMATCHED = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "procrast_request_duration_seconds",
+    "Time to produce a response, by URL name.",
+    ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    "procrast_requests",
+    "Responses by URL name and status code.",
+    ["view", "method", "status"],
+)
+DB_QUERIES = Histogram(
+    "procrast_db_queries_per_request",
+    "Database queries run while handling a request, by URL name.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REACTION_TOGGLES = Counter(
+    "procrast_reaction_toggles",
+    "Likes and dislikes added or removed from the feed.",
+    ["reaction", "action"],
+)
+POSTS_CREATED = Counter(
+    "procrast_posts_created",
+    "Posts created, from the form and admin or by the bulk importer.",
+    ["source"],
+)
+AB_PAGE_VIEWS = Counter(
+    "procrast_ab_page_views", "A/B test page views by variant.", ["variant"]
+)
+AB_CLICKS = Counter(
+    "procrast_ab_clicks", "A/B test button clicks by variant.", ["variant"]
+)
+CACHE_REQUESTS = Counter(
+    "procrast_cache_requests",
+    "Lookups of cached feeds, leaderboards and A/B data.",
+    ["cache", "result"],
+)
+STALE_SNAPSHOTS_SERVED = Counter(
+    "procrast_stale_snapshots_served",
+    "Feeds and leaderboards served from an old snapshot after a failed refresh.",
+    ["cache"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "procrast_log_records_dropped",
+    "Log records dropped because the logging queue was full.",
+)
+# Admission control (accounts/admission.py); gauges add up across live workers
+ADMISSION_IN_FLIGHT = Gauge(
+    "procrast_admission_in_flight",
+    "Requests admitted and still running, by URL name.",
+    ["view"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAITING = Gauge(
+    "procrast_admission_waiting",
+    "Requests waiting for a free slot, by URL name.",
+    ["view"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_SHED = Counter(
+    "procrast_admission_shed",
+    "Requests turned away with a 503, by URL name, priority and reason.",
+    ["view", "priority", "reason"],
+)
+
+
+def record_cache_lookup(name, hit):
+    CACHE_REQUESTS.labels(name, "hit" if hit else "miss").inc()
+
+
+def render_latest():
+    """Return ``(body, content_type)`` for the current metrics."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,361 @@
+import re
+import secrets
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import admission, health, log, metrics, profiling, slowlog
+from .responses import FastJsonResponse
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_CONTENT_TYPES = {"text/html", "application/json"}
+
+# Fast enough to run per request while still beating gzip on HTML
+BROTLI_QUALITY = 5
+
+
+def parse_accept_encoding(header):
+    """Return ``{coding: q}`` for an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def choose_encoding(header):
+    """Pick ``"br"``, ``"gzip"`` or None for the client's Accept-Encoding."""
+    codings = parse_accept_encoding(header)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    accepted = [c for c in candidates if codings.get(c, 0) > 0]
+    if not accepted:
+        return None
+    # Prefer the client's highest q-value, then brotli over gzip on a tie
+    return max(accepted, key=lambda c: (codings[c], c == "br"))
+
+
+def brotli_padding(max_random_bytes):
+    """
+    A brotli metadata block holding 1 to ``max_random_bytes`` (at most 256)
+    random bytes.
+
+    Decoders skip metadata, so like the random gzip filename Django adds, it
+    only makes the compressed length unpredictable. That stops BREACH-style
+    guessing of secrets in the page, such as CSRF tokens, from the length.
+    """
+    skip = secrets.randbelow(min(max_random_bytes, 256))
+    # ISLAST=0, MNIBBLES=0 (metadata), MSKIPBYTES=1, MSKIPLEN-1, byte aligned
+    header = bytes([0b0010110 | (skip & 0b11) << 6, skip >> 2])
+    return header + secrets.token_bytes(skip + 1)
+
+
+def _brotli_start(compressor, max_random_bytes):
+    # After a flush the stream is byte aligned, so a whole block can go next
+    return (
+        compressor.process(b"") + compressor.flush() + brotli_padding(max_random_bytes)
+    )
+
+
+def _brotli_sequence(sequence, max_random_bytes):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    yield _brotli_start(compressor, max_random_bytes)
+    for chunk in sequence:
+        # Flush per chunk so streamed output reaches the client as it's produced
+        yield compressor.process(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress HTML and JSON responses with brotli or gzip.
+
+    Only responses of at least ``COMPRESSION_MIN_SIZE`` bytes are compressed,
+    the encoding follows the client's Accept-Encoding (brotli is used when the
+    package is installed), and streaming responses are compressed chunk by
+    chunk without being buffered. Static files are left to WhiteNoise, which
+    serves precompressed copies built by collectstatic.
+
+    Both encodings pad their output by up to ``max_random_bytes`` random bytes
+    to mitigate BREACH: Django's gzip puts them in the header's filename, and
+    brotli in a metadata block (see ``brotli_padding``).
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in COMPRESSIBLE_CONTENT_TYPES:
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding == "gzip":
+            return super().process_response(request, response)
+        if encoding == "br":
+            return self.compress_brotli(response)
+        return response
+
+    def compress_brotli(self, response):
+        if response.streaming:
+            if response.is_async:
+                original_iterator = response.streaming_content
+
+                async def brotli_wrapper():
+                    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                    yield _brotli_start(compressor, self.max_random_bytes)
+                    async for chunk in original_iterator:
+                        yield compressor.process(chunk) + compressor.flush()
+                    yield compressor.finish()
+
+                response.streaming_content = brotli_wrapper()
+            else:
+                response.streaming_content = _brotli_sequence(
+                    response.streaming_content, self.max_random_bytes
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            compressed_content = (
+                _brotli_start(compressor, self.max_random_bytes)
+                + compressor.process(response.content)
+                + compressor.finish()
+            )
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+# Accepted from an X-Request-ID header set by a proxy; anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def view_name(request):
+    """The URL name a request resolved to, or ``metrics.UNMATCHED``."""
+    match = request.resolver_match
+    return match.view_name if match and match.url_name else metrics.UNMATCHED
+
+
+class QueryCounter:
+    """A database execute wrapper that counts the statements it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and database queries per URL name (accounts.metrics).
+
+    It comes after ``HealthCheckMiddleware`` and ``RequestIdMiddleware`` in
+    ``MIDDLEWARE``, so the timing covers the rest of the middleware and the
+    view. Health probes are answered before it and aren't recorded. Only
+    queries on the default database connection are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = view_name(request)
+        metrics.REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        metrics.REQUESTS.labels(view, request.method, response.status_code).inc()
+        metrics.DB_QUERIES.labels(view).observe(queries.count)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Log queries slower than ``SLOW_QUERY_THRESHOLD_MS`` (accounts.slowlog)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold <= 0:
+            return self.get_response(request)
+
+        # The view is looked up when a query is slow, after URL resolution
+        recorder = slowlog.SlowQueryRecorder(
+            lambda: view_name(request), threshold / 1000
+        )
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        slowlog.maybe_report()
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Limit concurrent requests per worker and shed the rest (accounts.admission).
+
+    Requests are admitted in ``process_view``, once the URL name is known,
+    and release their slot when the response is returned. Views in
+    ``ADMISSION_EXEMPT_VIEWS`` (``/metrics``) are always let through so
+    dashboards keep working under overload.
+    """
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.controller = admission.AdmissionController.from_settings()
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            admitted = getattr(request, "_admitted_view", None)
+            if admitted is not None:
+                self.controller.release(admitted)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = view_name(request)
+        if view in settings.ADMISSION_EXEMPT_VIEWS:
+            return None
+        priority = admission.priority_for(view)
+        reason = self.controller.acquire(view, priority)
+        if reason is None:
+            request._admitted_view = view  # pylint: disable=protected-access
+            return None
+        response = JsonResponse({"error": "Server busy, try again shortly"}, status=503)
+        response["Retry-After"] = str(settings.ADMISSION_RETRY_AFTER)
+        response["X-Shed-Reason"] = reason
+        patch_cache_control(response, no_store=True)
+        # Counted in procrast_admission_shed_total; logging every shed 503 as
+        # an error would add to the overload
+        response._has_been_logged = True  # pylint: disable=protected-access
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Replace a staff-requested response with a sampled profile (accounts.profiling).
+
+    It goes after ``AuthenticationMiddleware`` so ``?profile=1`` can check
+    ``request.user``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILER_ENABLED or not profiling.is_requested(request):
+            return self.get_response(request)
+
+        with profiling.Sampler() as sampler:
+            response = self.get_response(request)
+            if response.streaming:
+                # Produce the body inside the profile too; it is discarded
+                for _ in response.streaming_content:
+                    pass
+        # Only the profile is returned, so Django won't close this one
+        response.close()
+
+        profile = sampler.to_speedscope(f"{request.method} {request.get_full_path()}")
+        profiled = FastJsonResponse(profile)
+        profiled["Content-Disposition"] = (
+            'attachment; filename="profile.speedscope.json"'
+        )
+        profiled["X-Profiled-Status"] = str(response.status_code)
+        profiled["X-Profile-Breakdown"] = ", ".join(
+            f"{category}={seconds * 1000:.1f}ms"
+            for category, seconds in profile["breakdown"].items()
+        )
+        patch_cache_control(profiled, no_store=True)
+        return profiled
+
+
+class HealthCheckMiddleware:
+    """
+    Answer ``/healthz`` and ``/readyz`` (accounts.health) without going further.
+
+    It goes first in ``MIDDLEWARE``, ahead of host validation, so probes that
+    address an instance by its IP still get an answer.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = request.path_info.rstrip("/")
+        if path == health.LIVENESS_PATH:
+            response = HttpResponse(b"ok", content_type="text/plain")
+        elif path == health.READINESS_PATH:
+            ready, checks = health.readiness()
+            response = FastJsonResponse(
+                {"status": "ok" if ready else "unavailable", "checks": checks},
+                status=200 if ready else 503,
+            )
+            # Failed checks are logged by accounts.health, once each
+            response._has_been_logged = True  # pylint: disable=protected-access
+        else:
+            return self.get_response(request)
+        patch_cache_control(response, no_store=True)
+        return response
+
+
+class RequestIdMiddleware:
+    """
+    Tag the request, its log records and its response with a request id.
+
+    An ``X-Request-ID`` from the proxy is kept if it looks like an id;
+    otherwise a new one is generated.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get("HTTP_X_REQUEST_ID", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.id = request_id
+
+        token = log.request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            log.request_id.reset(token)
+        response["X-Request-ID"] = request_id
+        return response
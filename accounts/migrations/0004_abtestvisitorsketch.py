@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0003_abtestbuttonclick_abtestpageview"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ABTestVisitorSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.CharField(
+                        choices=[
+                            ("A", "Variant A (kudos)"),
+                            ("B", "Variant B (thanks)"),
+                        ],
+                        max_length=1,
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("registers", models.BinaryField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "A/B Test Visitor Sketch",
+                "verbose_name_plural": "A/B Test Visitor Sketches",
+                "ordering": ["-day", "variant"],
+                "unique_together": {("variant", "day")},
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0004_abtestvisitorsketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ABTestRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.CharField(
+                        choices=[
+                            ("A", "Variant A (kudos)"),
+                            ("B", "Variant B (thanks)"),
+                        ],
+                        max_length=1,
+                    ),
+                ),
+                ("bucket", models.DateTimeField(help_text="Start of the hour")),
+                ("page_views", models.PositiveIntegerField(default=0)),
+                ("clicks", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "A/B Test Rollup",
+                "verbose_name_plural": "A/B Test Rollups",
+                "ordering": ["bucket", "variant"],
+                "unique_together": {("variant", "bucket")},
+            },
+        ),
+    ]
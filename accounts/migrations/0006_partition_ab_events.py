@@ -0,0 +1,119 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:02
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+EVENT_TABLES = ["accounts_abtestpageview", "accounts_abtestbuttonclick"]
+MONTHS_AHEAD = 2
+
+
+def _month_index(value):
+    return value.year * 12 + value.month - 1
+
+
+def _month(index):
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_tables(apps, schema_editor):
+    """Rebuild the event tables as monthly range partitions on PostgreSQL."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for table in EVENT_TABLES:
+            old = f"{table}_unpartitioned"
+            cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+            cursor.execute(
+                f"CREATE TABLE {quote(table)} "
+                f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+                "PARTITION BY RANGE (created_at)"
+            )
+            # A unique constraint on a partitioned table must include the key
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, created_at)")
+            cursor.execute(
+                f"CREATE TABLE {quote(table + '_default')} "
+                f"PARTITION OF {quote(table)} DEFAULT"
+            )
+
+            cursor.execute(f"SELECT MIN(created_at) FROM {quote(old)}")
+            first = cursor.fetchone()[0] or datetime.now(timezone.utc)
+            last = _month_index(datetime.now(timezone.utc)) + MONTHS_AHEAD
+            for index in range(_month_index(first), last + 1):
+                start, end = _month(index), _month(index + 1)
+                cursor.execute(
+                    f"CREATE TABLE {quote(f'{table}_p{start:%Y%m}')} "
+                    f"PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+
+            cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {quote(table)}",
+                [table],
+            )
+            cursor.execute(f"DROP TABLE {quote(old)}")
+
+
+def unpartition_tables(apps, schema_editor):
+    """Copy the partitioned event tables back into plain tables."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        for table in EVENT_TABLES:
+            old = f"{table}_partitioned"
+            cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+            cursor.execute(
+                f"CREATE TABLE {quote(table)} "
+                f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY)"
+            )
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id)")
+            cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {quote(table)}",
+                [table],
+            )
+            # Dropping the parent drops every partition with it
+            cursor.execute(f"DROP TABLE {quote(old)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_abtestrollup"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="abtestbuttonclick",
+            options={
+                "verbose_name": "A/B Test Button Click",
+                "verbose_name_plural": "A/B Test Button Clicks",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="abtestpageview",
+            options={
+                "verbose_name": "A/B Test Page View",
+                "verbose_name_plural": "A/B Test Page Views",
+            },
+        ),
+        # Before the indexes, so they are created on the partitioned tables
+        migrations.RunPython(partition_tables, unpartition_tables),
+        migrations.AddIndex(
+            model_name="abtestbuttonclick",
+            index=models.Index(
+                fields=["created_at"], name="accounts_ab_created_e913f1_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="abtestpageview",
+            index=models.Index(
+                fields=["created_at"], name="accounts_ab_created_bf4df4_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def backfill_user_stats(apps, schema_editor):
+    """Create a UserStats row for every existing user from grouped aggregates."""
+    User = apps.get_model("auth", "User")
+    Post = apps.get_model("accounts", "Post")
+    Like = apps.get_model("accounts", "Like")
+    Dislike = apps.get_model("accounts", "Dislike")
+    UserStats = apps.get_model("accounts", "UserStats")
+
+    def grouped(queryset, key, **aggregates):
+        return {
+            row.pop(key): row
+            for row in queryset.values(key).annotate(**aggregates).order_by()
+        }
+
+    posts = grouped(
+        Post.objects, "author", n=Count("id"), hours=Sum("hours_procrastinated")
+    )
+    likes_given = grouped(Like.objects, "user", n=Count("id"))
+    dislikes_given = grouped(Dislike.objects, "user", n=Count("id"))
+    likes_received = grouped(Like.objects, "post__author", n=Count("id"))
+    dislikes_received = grouped(Dislike.objects, "post__author", n=Count("id"))
+
+    def count(rows, user_id):
+        return rows.get(user_id, {}).get("n", 0)
+
+    UserStats.objects.bulk_create(
+        [
+            UserStats(
+                user_id=user_id,
+                post_count=count(posts, user_id),
+                total_hours=posts.get(user_id, {}).get("hours") or 0,
+                likes_given=count(likes_given, user_id),
+                dislikes_given=count(dislikes_given, user_id),
+                likes_received=count(likes_received, user_id),
+                dislikes_received=count(dislikes_received, user_id),
+            )
+            for user_id in User.objects.values_list("id", flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("accounts", "0008_post_created_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("post_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_hours",
+                    models.DecimalField(
+                        db_index=True, decimal_places=2, default=0, max_digits=12
+                    ),
+                ),
+                ("likes_given", models.PositiveIntegerField(default=0)),
+                ("dislikes_given", models.PositiveIntegerField(default=0)),
+                ("likes_received", models.PositiveIntegerField(default=0)),
+                ("dislikes_received", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "User Stats",
+                "verbose_name_plural": "User Stats",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-created_at", "-id"],
+                name="accounts_po_author__a95f1a_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0011_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.SlugField(unique=True)),
+                ("post_count", models.PositiveIntegerField(db_index=True, default=0)),
+                (
+                    "total_hours",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="tag_names",
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.CreateModel(
+            name="PostTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hours_procrastinated",
+                    models.DecimalField(decimal_places=2, max_digits=5),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("like_count", models.PositiveIntegerField(default=0)),
+                ("dislike_count", models.PositiveIntegerField(default=0)),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tagged_posts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tag_links",
+                        to="accounts.post",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="post_links",
+                        to="accounts.tag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="posts",
+                through="accounts.PostTag",
+                to="accounts.tag",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posttag",
+            index=models.Index(
+                fields=["tag", "-created_at", "-post"],
+                name="accounts_po_tag_id_3ef657_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posttag",
+            index=models.Index(
+                fields=["tag", "-like_count", "-created_at"],
+                name="accounts_po_tag_id_ebbd54_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posttag",
+            index=models.Index(
+                fields=["tag", "-dislike_count", "-created_at"],
+                name="accounts_po_tag_id_c380de_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="posttag",
+            unique_together={("tag", "post")},
+        ),
+    ]
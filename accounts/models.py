@@ -10,14 +10,32 @@ class Post(models.Model):
     description = models.TextField()
     hours_procrastinated = models.DecimalField(max_digits=5, decimal_places=2)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so imported posts keep their timestamp
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Kept current by signals; ``comments.recount_comments`` recomputes it
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    tags = models.ManyToManyField(
+        "Tag", through="PostTag", related_name="posts", blank=True
+    )
+    # Comma-separated copy of the post's tag names, so cards can show them
+    # without a query (set by ``tags.set_post_tags``)
+    tag_names = models.CharField(max_length=300, blank=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"]),
+            # Profile pages walk one author's posts newest first
+            models.Index(fields=["author", "-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author.username}"
 
+    @property
+    def tag_list(self):
+        return self.tag_names.split(",") if self.tag_names else []
+
     def get_like_count(self):
         """Get the total number of likes for this post."""
         return self.likes.count()
@@ -57,6 +75,194 @@ class Dislike(models.Model):
         return f"{self.user.username} disliked {self.post.title}"
 
 
+class Tag(models.Model):
+    """
+    A topic posts can be tagged with (see tags.py).
+
+    ``post_count`` and ``total_hours`` are running totals over the tagged
+    posts, kept current by signals.
+    """
+
+    name = models.SlugField(max_length=50, unique=True)
+    post_count = models.PositiveIntegerField(default=0, db_index=True)
+    total_hours = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class PostTag(models.Model):
+    """
+    A post's tag: the explicit through table of ``Post.tags``.
+
+    The post's author, hours and creation time are copied here, and its
+    like and dislike counts are kept current by signals. A tag's feed and
+    leaderboards are then range scans on this table's ``(tag, ...)``
+    indexes, with no join or aggregate over the reaction tables.
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="tag_links")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="post_links")
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="tagged_posts"
+    )
+    hours_procrastinated = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField()
+    like_count = models.PositiveIntegerField(default=0)
+    dislike_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["tag", "post"]
+        indexes = [
+            models.Index(fields=["tag", "-created_at", "-post"]),
+            models.Index(fields=["tag", "-like_count", "-created_at"]),
+            models.Index(fields=["tag", "-dislike_count", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} tagged {self.tag_id}"
+
+
+class Comment(models.Model):
+    """
+    A comment on a post, or a reply to another comment (see comments.py).
+
+    ``path`` is the materialised path: the zero-padded ids of the comment's
+    ancestors and then its own. Ordering a post's comments by path lists
+    every thread depth-first, and a subtree is a path prefix.
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.CASCADE, related_name="replies"
+    )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    body = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ["path"]
+        indexes = [models.Index(fields=["post", "path"])]
+
+    def __str__(self):
+        return f"Comment {self.pk} on post {self.post_id}"
+
+
+class PostVector(models.Model):
+    """A post's hashed text vector, as float32 bytes (see similarity.py)."""
+
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True, related_name="vector"
+    )
+    vector = models.BinaryField()
+
+    def __str__(self):
+        return f"Vector for post {self.post_id}"
+
+
+class SimilarPost(models.Model):
+    """
+    One of a post's nearest neighbours by text, with its cosine similarity.
+
+    Rows are written by similarity.py's batch job and when posts are
+    created, so the "similar posts" panel is one read of the
+    ``(post, -score)`` index.
+    """
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="similar_links"
+    )
+    similar = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ["post", "similar"]
+        indexes = [models.Index(fields=["post", "-score"])]
+
+    def __str__(self):
+        return f"Post {self.similar_id} is similar to {self.post_id}"
+
+
+class Follow(models.Model):
+    """A user following another user's posts."""
+
+    follower = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="following"
+    )
+    followee = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="followers"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ["follower", "followee"]
+        constraints = [
+            models.CheckConstraint(
+                check=~models.Q(follower=models.F("followee")),
+                name="follow_not_self",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.followee.username}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post pushed into a follower's home timeline (see timelines.py).
+
+    ``author`` and ``created_at`` are copied from the post so a page of the
+    timeline, and an unfollow, only need this table's indexes.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ["user", "post"]
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"]),
+            models.Index(fields=["user", "author"]),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s timeline"
+
+
+class UserStats(models.Model):
+    """
+    Running per-user totals for profile pages, kept current by signals.
+
+    ``profiles.rebuild_user_stats`` recomputes them from the source tables.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    total_hours = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, db_index=True
+    )
+    likes_given = models.PositiveIntegerField(default=0)
+    dislikes_given = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    dislikes_received = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "User Stats"
+        verbose_name_plural = "User Stats"
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+
 class ABTestPageView(models.Model):
     """Model to track page views for the A/B test endpoint."""
 
@@ -71,7 +277,10 @@ class ABTestPageView(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["-created_at"]
+        # No default ordering: these tables are append-only and large, and the
+        # admin sorts by the created_at index itself. On PostgreSQL they are
+        # partitioned by month (see partitions.py).
+        indexes = [models.Index(fields=["created_at"])]
         verbose_name = "A/B Test Page View"
         verbose_name_plural = "A/B Test Page Views"
 
@@ -93,7 +302,10 @@ class ABTestButtonClick(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["-created_at"]
+        # No default ordering: these tables are append-only and large, and the
+        # admin sorts by the created_at index itself. On PostgreSQL they are
+        # partitioned by month (see partitions.py).
+        indexes = [models.Index(fields=["created_at"])]
         verbose_name = "A/B Test Button Click"
         verbose_name_plural = "A/B Test Button Clicks"
 
@@ -104,3 +316,43 @@ class ABTestButtonClick(models.Model):
     def get_click_count_by_variant(cls, variant):
         """Get total click count for a specific variant."""
         return cls.objects.filter(variant=variant).count()
+
+
+class ABTestVisitorSketch(models.Model):
+    """HyperLogLog registers estimating unique visitors per variant per day."""
+
+    VARIANT_CHOICES = ABTestPageView.VARIANT_CHOICES
+
+    variant = models.CharField(max_length=1, choices=VARIANT_CHOICES)
+    day = models.DateField()
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["variant", "day"]
+        ordering = ["-day", "variant"]
+        verbose_name = "A/B Test Visitor Sketch"
+        verbose_name_plural = "A/B Test Visitor Sketches"
+
+    def __str__(self):
+        return f"Visitor sketch - Variant {self.variant} on {self.day}"
+
+
+class ABTestRollup(models.Model):
+    """Hourly page-view and click counts per variant, rolled up from raw events."""
+
+    VARIANT_CHOICES = ABTestPageView.VARIANT_CHOICES
+
+    variant = models.CharField(max_length=1, choices=VARIANT_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the hour")
+    page_views = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["variant", "bucket"]
+        ordering = ["bucket", "variant"]
+        verbose_name = "A/B Test Rollup"
+        verbose_name_plural = "A/B Test Rollups"
+
+    def __str__(self):
+        return f"Rollup - Variant {self.variant} at {self.bucket}"
@@ -0,0 +1,204 @@
+"""
+Monthly partitions and retention for the append-only A/B event tables.
+
+On PostgreSQL, ``ABTestPageView`` and ``ABTestButtonClick`` are declaratively
+partitioned by month on ``created_at`` (see migration 0006). Each month is its
+own table, ``<table>_pYYYYMM``, and a ``<table>_default`` partition catches
+rows outside every range, so an insert never fails. Inserts only touch the
+current month's small indexes, and queries on a time range skip the other
+months. Old months are removed with ``DROP TABLE`` instead of a large DELETE.
+
+Other databases, such as SQLite in development, keep plain tables. They use
+the ``created_at`` index, and retention deletes in batches.
+
+Upcoming months are created after every ``migrate`` (so on each deploy) and
+by the daily ``maintain_event_tables`` cron job in ``render.yaml``.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import abtesting
+from .models import ABTestButtonClick, ABTestPageView
+
+logger = logging.getLogger(__name__)
+
+EVENT_MODELS = (ABTestPageView, ABTestButtonClick)
+
+
+def month_start(value):
+    """The first instant of ``value``'s month, in UTC."""
+    value = value.astimezone(dt_timezone.utc) if timezone.is_aware(value) else value
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(table, conn=None):
+    """Whether ``table`` is a partitioned PostgreSQL table."""
+    conn = conn or connection
+    if conn.vendor != "postgresql":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            # to_regclass, not ::regclass, so a missing table is just "no"
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, conn=None):
+    """Return ``{month_start: partition_name}`` for the monthly partitions."""
+    conn = conn or connection
+    prefix = f"{table}_p"
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        suffix = name[len(prefix) :]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            month = datetime(
+                int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc
+            )
+            partitions[month] = name
+    return partitions
+
+
+def create_partition(table, month, conn=None):
+    """
+    Create the partition for ``month`` if it doesn't exist.
+
+    Rows for that month that already landed in the default partition are
+    moved into the new one before it is attached.
+    """
+    conn = conn or connection
+    name = partition_name(table, month)
+    default = f"{table}_default"
+    quote = conn.ops.quote_name
+    bounds = [month, add_months(month, 1)]
+
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {quote(default)} "
+            "WHERE created_at >= %s AND created_at < %s)",
+            bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                bounds,
+            )
+            return True
+
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(default)} "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved",
+            bounds,
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            bounds,
+        )
+    return True
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """
+    Create partitions from this month through ``months_ahead`` months ahead.
+
+    Does nothing on databases without partitioning. Returns the names of the
+    partitions created.
+    """
+    if months_ahead is None:
+        months_ahead = settings.EVENT_PARTITION_MONTHS_AHEAD
+    this_month = month_start(now or timezone.now())
+
+    created = []
+    for model in EVENT_MODELS:
+        table = model._meta.db_table
+        if not is_partitioned(table):
+            continue
+        for offset in range(months_ahead + 1):
+            month = add_months(this_month, offset)
+            if create_partition(table, month):
+                created.append(partition_name(table, month))
+    return created
+
+
+def _delete_in_batches(model, cutoff, batch_size):
+    deleted = 0
+    while True:
+        ids = list(
+            model.objects.filter(created_at__lt=cutoff)
+            .order_by()
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += model.objects.filter(id__in=ids).delete()[0]
+
+
+def apply_retention(days=None, now=None, batch_size=5000):
+    """
+    Roll up, then remove raw events older than ``days`` days.
+
+    The hourly rollups are brought up to date first, so reporting keeps every
+    hour after the raw rows are gone. On PostgreSQL, months that end before
+    the cutoff are dropped whole. Returns
+    ``{table: {"partitions_dropped": n, "rows_deleted": n}}``.
+    """
+    if days is None:
+        days = settings.EVENT_RETENTION_DAYS
+    if not days:
+        return {}
+
+    now = now or timezone.now()
+    cutoff = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    abtesting.rollup_events()
+
+    removed = {}
+    for model in EVENT_MODELS:
+        table = model._meta.db_table
+        dropped = 0
+        if is_partitioned(table):
+            quote = connection.ops.quote_name
+            for month, name in sorted(list_partitions(table).items()):
+                if add_months(month, 1) > cutoff:
+                    break
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {quote(name)}")
+                logger.info("Dropped partition %s", name)
+                dropped += 1
+        deleted = _delete_in_batches(model, cutoff, batch_size)
+        removed[table] = {"partitions_dropped": dropped, "rows_deleted": deleted}
+    return removed
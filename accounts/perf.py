@@ -0,0 +1,161 @@
+"""
+Query-count and latency budgets for the performance tests.
+
+Each budget is stored under a key such as ``"home[100]"`` in
+``PERF_BASELINE_FILE``, a JSON file that is committed with the code. Wrap the
+code being checked in ``performance_budget(key)``. The block then fails if it
+runs more queries than the baseline recorded. ``data_sizes`` runs a test once
+per data size, so N+1 queries show up as query counts that grow with the data.
+
+Wall-clock time is only checked when ``PERF_CHECK_TIME`` is on, because it
+varies too much on shared CI machines. The block then also fails if it takes
+longer than the recorded time times ``PERF_TIME_TOLERANCE``, with budgets never
+below ``PERF_MIN_TIME_BUDGET`` seconds. Run that on a quiet machine, ideally
+the one the baselines were recorded on.
+
+After an intended change, re-record the baselines with
+``python manage.py update_perf_baselines``. It keeps the most queries seen and
+the median time over its runs.
+"""
+
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+# Set by the update_perf_baselines command: budgets are recorded, not checked.
+# Maps each key to {"queries": [...], "seconds": [...]}, one entry per run.
+_recorded = None
+
+
+class PerformanceRegression(AssertionError):
+    """A block ran more queries, or took longer, than its baseline allows."""
+
+
+class Measurement:
+    def __init__(self, key):
+        self.key = key
+        self.queries = None
+        self.seconds = None
+        self.captured = []
+
+
+def load_baselines(path=None):
+    try:
+        with open(path or settings.PERF_BASELINE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(baselines, path=None):
+    with open(path or settings.PERF_BASELINE_FILE, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def start_recording():
+    global _recorded
+    _recorded = {}
+
+
+def stop_recording():
+    """
+    Stop recording and return ``{key: {"queries": n, "seconds": s}}``: the
+    most queries and the median time measured for each key.
+    """
+    global _recorded
+    recorded, _recorded = _recorded, None
+    return {
+        key: {
+            "queries": max(samples["queries"]),
+            "seconds": round(statistics.median(samples["seconds"]), 4),
+        }
+        for key, samples in recorded.items()
+    }
+
+
+def time_budget(baseline_seconds):
+    return max(
+        baseline_seconds * settings.PERF_TIME_TOLERANCE, settings.PERF_MIN_TIME_BUDGET
+    )
+
+
+def record(measurement):
+    """Add one run's queries and time for the key."""
+    samples = _recorded.setdefault(measurement.key, {"queries": [], "seconds": []})
+    samples["queries"].append(measurement.queries)
+    samples["seconds"].append(measurement.seconds)
+
+
+def check(measurement, baselines=None):
+    """Raise ``PerformanceRegression`` if ``measurement`` is over its budget."""
+    baseline = (baselines if baselines is not None else load_baselines()).get(
+        measurement.key
+    )
+    if baseline is None:
+        raise PerformanceRegression(
+            f"No baseline for {measurement.key!r}; "
+            "run `python manage.py update_perf_baselines`."
+        )
+    if measurement.queries > baseline["queries"]:
+        statements = "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(measurement.captured, 1)
+        )
+        raise PerformanceRegression(
+            f"{measurement.key}: {measurement.queries} queries, baseline is "
+            f"{baseline['queries']}.\n{statements}"
+        )
+    if not settings.PERF_CHECK_TIME:
+        return
+    budget = time_budget(baseline["seconds"])
+    if measurement.seconds > budget:
+        raise PerformanceRegression(
+            f"{measurement.key}: took {measurement.seconds * 1000:.1f} ms, budget is "
+            f"{budget * 1000:.1f} ms (baseline {baseline['seconds'] * 1000:.1f} ms)."
+        )
+
+
+@contextmanager
+def performance_budget(key):
+    """Check the queries run and time taken by the block against ``key``."""
+    measurement = Measurement(key)
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        yield measurement
+        measurement.seconds = time.perf_counter() - start
+    measurement.queries = len(queries)
+    measurement.captured = queries.captured_queries
+    if _recorded is not None:
+        record(measurement)
+    else:
+        check(measurement)
+
+
+def data_sizes(*sizes):
+    """
+    Run a test method once per size, as ``method(self, size)``.
+
+    Each size runs in a subTest with an empty cache, and its data is rolled
+    back afterwards so sizes don't see each other's rows.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self):
+            for size in sizes:
+                with self.subTest(size=size):
+                    cache.clear()
+                    with transaction.atomic():
+                        method(self, size)
+                        transaction.set_rollback(True)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,149 @@
+"""
+Per-user profile stats and cursor-paginated post history.
+
+Totals live in ``UserStats`` rows that signals adjust with single ``F()``
+updates as posts and reactions come and go. A profile is then one primary-key
+read instead of aggregates over every post and reaction. Post history is
+paginated by ``(created_at, id)`` keyset cursors on the author index, so
+later pages cost the same as the first.
+"""
+
+import base64
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Subquery, Sum
+from django.utils.dateparse import parse_datetime
+
+from .models import Dislike, Follow, Like, Post, UserStats
+from .queries import reaction_count
+
+STAT_FIELDS = (
+    "post_count",
+    "total_hours",
+    "likes_given",
+    "dislikes_given",
+    "likes_received",
+    "dislikes_received",
+    "follower_count",
+    "following_count",
+)
+
+
+def compute_stats(user_id):
+    """Aggregate a user's totals from the source tables."""
+    posts = Post.objects.filter(author_id=user_id).aggregate(
+        post_count=Count("id"), total_hours=Sum("hours_procrastinated")
+    )
+    return {
+        "post_count": posts["post_count"],
+        "total_hours": posts["total_hours"] or Decimal("0"),
+        "likes_given": Like.objects.filter(user_id=user_id).count(),
+        "dislikes_given": Dislike.objects.filter(user_id=user_id).count(),
+        "likes_received": Like.objects.filter(post__author_id=user_id).count(),
+        "dislikes_received": Dislike.objects.filter(post__author_id=user_id).count(),
+        "follower_count": Follow.objects.filter(followee_id=user_id).count(),
+        "following_count": Follow.objects.filter(follower_id=user_id).count(),
+    }
+
+
+def rebuild_user_stats(user_id):
+    """Recompute and store one user's stats."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=compute_stats(user_id)
+    )
+    return stats
+
+
+def get_user_stats(user):
+    """Return the user's ``UserStats``, computing it if it's missing."""
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return rebuild_user_stats(user.pk)
+
+
+def adjust(user_id, create_missing=True, **deltas):
+    """
+    Add ``deltas`` to a user's counters in one UPDATE.
+
+    A missing row is computed from scratch (which already includes the
+    change) when ``create_missing`` is set; deletions pass ``False`` so a user
+    being deleted isn't recreated.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    if create_missing:
+        try:
+            with transaction.atomic():
+                UserStats.objects.create(user_id=user_id, **compute_stats(user_id))
+        except IntegrityError:
+            # Created concurrently; apply the change to that row instead
+            UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def adjust_post_author(post_id, create_missing=True, **deltas):
+    """``adjust`` the author of ``post_id`` without loading the post."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    author = Post.objects.filter(pk=post_id).values("author_id")
+    if UserStats.objects.filter(user_id=Subquery(author)).update(**changes):
+        return
+    if create_missing:
+        author_id = author.values_list("author_id", flat=True).first()
+        if author_id is not None:
+            adjust(author_id, **deltas)
+
+
+def get_rank(stats):
+    """Rank by total hours among users who have posted (ties share a rank)."""
+    if not stats.post_count:
+        return None
+    return UserStats.objects.filter(total_hours__gt=stats.total_hours).count() + 1
+
+
+def encode_cursor(post):
+    raw = f"{post.created_at.isoformat()}|{post.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)``, or ``None`` if the cursor is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _, pk = base64.urlsafe_b64decode(padded).decode().partition("|")
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+def get_posts_page(user, cursor=None, page_size=None):
+    """
+    Return ``(posts, next_cursor)`` for the user's posts, newest first.
+
+    Each post carries ``like_count`` and ``dislike_count``, which are counted
+    only for the rows on the page.
+    """
+    page_size = page_size or settings.PROFILE_PAGE_SIZE
+    posts = (
+        Post.objects.filter(author=user)
+        .annotate(
+            like_count=reaction_count(Like), dislike_count=reaction_count(Dislike)
+        )
+        .order_by("-created_at", "-id")
+    )
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, pk = position
+        posts = posts.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    page = list(posts[: page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
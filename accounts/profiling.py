@@ -0,0 +1,169 @@
+"""
+On-demand sampling profiler for single live requests.
+
+Staff can profile a request by adding ``?profile=1`` while logged in, or by
+sending an ``X-Profile-Token`` header. The header holds a signed token from
+``manage.py profiling_token``, so it also works from curl. While the view
+runs, a background thread samples the request thread's stack every
+``PROFILER_INTERVAL_MS``. The response is then replaced by the samples in
+speedscope's file format (https://www.speedscope.app), which also renders
+them as a flame graph.
+
+Each sample is also classed as ``orm`` (under django.db), ``template`` (under
+django.template) or ``python``. The innermost matching frame decides, so a
+query run from a template counts as ORM time. The totals are returned in the
+``X-Profile-Breakdown`` header and the ``breakdown`` key of the file.
+
+Requests without the flag or header only pay for the check in
+``ProfilingMiddleware``.
+"""
+
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+
+TOKEN_SALT = "accounts.profiling"
+TOKEN_HEADER = "HTTP_X_PROFILE_TOKEN"
+QUERY_FLAG = "profile"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+CATEGORIES = (
+    ("orm", ("/django/db/",)),
+    ("template", ("/django/template/", "/django/templatetags/")),
+)
+DEFAULT_CATEGORY = "python"
+
+
+def make_token(username):
+    return signing.dumps({"user": username}, salt=TOKEN_SALT)
+
+
+def check_token(token):
+    """
+    Return the username a valid, unexpired token was issued to, or None.
+
+    The user must still be active staff: a token outlives neither a
+    deactivation nor a demotion.
+    """
+    try:
+        data = signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    username = data.get("user")
+    if not User.objects.filter(
+        username=username, is_active=True, is_staff=True
+    ).exists():
+        return None
+    return username
+
+
+def is_requested(request):
+    """Whether the request asks to be profiled and is allowed to be."""
+    token = request.META.get(TOKEN_HEADER)
+    if token:
+        return check_token(token) is not None
+    if QUERY_FLAG in request.GET:
+        user = getattr(request, "user", None)
+        return user is not None and user.is_active and user.is_staff
+    return False
+
+
+def categorize(filenames):
+    """Class a stack (innermost first) as ``orm``, ``template`` or ``python``."""
+    for filename in filenames:
+        for category, markers in CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+    return DEFAULT_CATEGORY
+
+
+class Sampler:
+    """Sample one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id=None, interval=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = (interval or settings.PROFILER_INTERVAL_MS) / 1000
+        self.samples = []
+        self.started = self.stopped = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(  # pylint: disable=protected-access
+                self.thread_id
+            )
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            # Weighted by the time since the previous sample
+            self.samples.append((stack, now - last))
+            last = now
+
+    def breakdown(self):
+        """Return ``{category: seconds}`` over all samples."""
+        totals = dict.fromkeys([c for c, _ in CATEGORIES] + [DEFAULT_CATEGORY], 0.0)
+        for stack, weight in self.samples:
+            totals[categorize(filename for _, filename, _ in stack)] += weight
+        return totals
+
+    def to_speedscope(self, name):
+        """Return the samples as a speedscope "sampled" profile document."""
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, weight in self.samples:
+            indexes = []
+            # Speedscope stacks are outermost first
+            for key in reversed(stack):
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    function, filename, line = key
+                    frames.append({"name": function, "file": filename, "line": line})
+                indexes.append(frame_index[key])
+            samples.append(indexes)
+            weights.append(weight)
+
+        duration = (self.stopped or time.perf_counter()) - self.started
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "procrast_local",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": duration,
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "breakdown": self.breakdown(),
+        }
@@ -0,0 +1,23 @@
+"""
+Query expressions shared by views, the admin and the profile pages.
+"""
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def reaction_count(model):
+    """
+    Count ``model`` (Like or Dislike) rows for each post as a subquery.
+
+    A correlated subquery is only evaluated for the rows actually fetched,
+    where a JOIN + GROUP BY would aggregate every post before slicing.
+    """
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
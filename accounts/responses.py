@@ -0,0 +1,25 @@
+import json
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    A compact JSON response encoded with orjson when it is installed.
+
+    Unlike ``JsonResponse`` this writes no whitespace, and ``data`` must only
+    contain JSON-native types (no Decimal or datetime).
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        if orjson is not None:
+            content = orjson.dumps(data)
+        else:
+            content = json.dumps(data, separators=(",", ":"))
+        super().__init__(content=content, **kwargs)
@@ -0,0 +1,184 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, metrics, partitions, profiles, similarity, tags, timelines
+from .models import (
+    ABTestButtonClick,
+    Comment,
+    Dislike,
+    Follow,
+    Like,
+    Post,
+    PostTag,
+    UserStats,
+)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Dislike)
+@receiver(post_delete, sender=Dislike)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=PostTag)
+@receiver(post_delete, sender=PostTag)
+def invalidate_post_caches(sender, **kwargs):
+    """Drop the cached feed and leaderboards whenever a post's counts change."""
+    caching.bump_generation()
+
+
+@receiver(post_save, sender=ABTestButtonClick)
+def count_ab_click(sender, instance, created, **kwargs):
+    """Keep the cached A/B click totals in step with new clicks."""
+    if created:
+        caching.record_ab_click(instance.variant)
+        metrics.AB_CLICKS.labels(instance.variant).inc()
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Give every new user an empty stats row."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def index_similar_posts(sender, instance, created, raw=False, **kwargs):
+    """Find a new post's similar posts once it is committed."""
+    if created and not raw and settings.SIMILAR_POSTS_INDEX_ON_CREATE:
+        post_id = instance.pk
+        transaction.on_commit(lambda: similarity.index_post_later(post_id))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_totals(sender, instance, raw=False, **kwargs):
+    """Note an edited post's previous author and hours for the stats update."""
+    if instance.pk and not raw:
+        instance._previous_totals = (
+            Post.objects.filter(pk=instance.pk)
+            .values("author_id", "hours_procrastinated")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    """Keep the author's post count and total hours current."""
+    if raw:
+        return
+    hours = Decimal(str(instance.hours_procrastinated))
+    previous = getattr(instance, "_previous_totals", None)
+    if created or previous is None:
+        profiles.adjust(instance.author_id, post_count=1, total_hours=hours)
+        timelines.fan_out_posts([instance])
+        metrics.POSTS_CREATED.labels("create").inc()
+        return
+    if previous["author_id"] != instance.author_id:
+        # Received reactions move with the post; recount both authors
+        profiles.rebuild_user_stats(previous["author_id"])
+        profiles.rebuild_user_stats(instance.author_id)
+    elif previous["hours_procrastinated"] != hours:
+        profiles.adjust(
+            instance.author_id,
+            total_hours=hours - previous["hours_procrastinated"],
+        )
+    else:
+        return
+    tags.post_changed(
+        instance.pk,
+        instance.author_id,
+        hours,
+        hours - previous["hours_procrastinated"],
+    )
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    profiles.adjust(
+        instance.author_id,
+        create_missing=False,
+        post_count=-1,
+        total_hours=-Decimal(str(instance.hours_procrastinated)),
+    )
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Dislike)
+def count_reaction(sender, instance, created, raw=False, **kwargs):
+    """Count a new reaction for the user giving it and the author receiving it."""
+    if created and not raw:
+        kind = "likes" if sender is Like else "dislikes"
+        profiles.adjust(instance.user_id, **{f"{kind}_given": 1})
+        profiles.adjust_post_author(instance.post_id, **{f"{kind}_received": 1})
+        tags.adjust_reactions(instance.post_id, **{f"{kind[:-1]}_count": 1})
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Dislike)
+def uncount_reaction(sender, instance, **kwargs):
+    kind = "likes" if sender is Like else "dislikes"
+    profiles.adjust(instance.user_id, create_missing=False, **{f"{kind}_given": -1})
+    profiles.adjust_post_author(
+        instance.post_id, create_missing=False, **{f"{kind}_received": -1}
+    )
+    tags.adjust_reactions(instance.post_id, **{f"{kind[:-1]}_count": -1})
+
+
+@receiver(post_save, sender=Follow)
+def start_following(sender, instance, created, raw=False, **kwargs):
+    """Count the follow and backfill the follower's timeline."""
+    if created and not raw:
+        profiles.adjust(instance.follower_id, following_count=1)
+        profiles.adjust(instance.followee_id, follower_count=1)
+        timelines.backfill(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_delete, sender=Follow)
+def stop_following(sender, instance, **kwargs):
+    profiles.adjust(instance.follower_id, create_missing=False, following_count=-1)
+    profiles.adjust(instance.followee_id, create_missing=False, follower_count=-1)
+    timelines.remove(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    """Keep the post's comment count current."""
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F("comment_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    # Replies deleted with their parent each send their own post_delete
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F("comment_count") - 1
+    )
+
+
+@receiver(post_save, sender=PostTag)
+def count_tagged_post(sender, instance, created, raw=False, **kwargs):
+    """Add a newly tagged post to the tag's totals."""
+    if created and not raw:
+        tags.adjust_tag(instance.tag_id, 1, instance.hours_procrastinated)
+
+
+@receiver(post_delete, sender=PostTag)
+def uncount_tagged_post(sender, instance, **kwargs):
+    tags.adjust_tag(instance.tag_id, -1, -instance.hours_procrastinated)
+
+
+@receiver(post_migrate)
+def create_event_partitions(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Create the coming months' event partitions on every deploy's migrate."""
+    if sender.name == "accounts" and using == DEFAULT_DB_ALIAS:
+        partitions.ensure_partitions()
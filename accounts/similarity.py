@@ -0,0 +1,328 @@
+"""
+"Similar posts": each post's nearest neighbours by title and description.
+
+A post becomes a vector by feature hashing. Each word (lowercased, with stop
+words dropped) is hashed to one of ``SIMILAR_POSTS_DIMENSIONS`` slots with a
++1 or -1 sign and weighted ``1 + log(count)``. Title words count twice. The
+vector is then scaled to unit length, so the dot product of two vectors is
+their cosine similarity. Hashing needs no vocabulary or corpus statistics.
+A new post is therefore vectorised exactly as the batch job would do it, and
+adding one never invalidates the vectors already stored.
+
+``rebuild_similar_posts`` recomputes every vector and neighbour list. It
+holds all the vectors in one ``N x dimensions`` float32 matrix and multiplies
+it by its transpose ``SIMILAR_POSTS_BLOCK_SIZE`` rows at a time, so at most
+``block_size x N`` scores are in memory at once. ``index_post`` adds one post
+without a rebuild. It scores the post against the stored vectors block by
+block and keeps its top ``SIMILAR_POSTS_COUNT``. It also joins the lists of
+existing posts where it beats the weakest neighbour. Edited posts keep their
+old vector until the next rebuild.
+
+New posts are indexed off the request by one background thread per process,
+from a queue of at most ``SIMILAR_POSTS_QUEUE_SIZE`` posts. So a burst of
+posts never runs more than one scan of the vectors at a time, or holds more
+than one extra connection. Posts that don't fit in the queue are left for the
+scheduled ``compute_similar_posts --incremental`` run.
+
+NumPy is imported inside the functions that use it, so importing this module
+(which ``signals`` does at startup) doesn't load it into every worker.
+"""
+
+import logging
+import math
+import queue
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Post, PostVector, SimilarPost
+
+logger = logging.getLogger(__name__)
+
+# Created on first use, so a preloading gunicorn master starts no thread
+_index_queue = None
+_index_queue_lock = threading.Lock()
+
+TITLE_WEIGHT = 2
+_WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+    a about after again all also am an and any are as at be because been before
+    being but by can could did do does doing don for from had has have having he
+    her here hers him his how if in into is it its just me more most my no nor
+    not now of off on once only or other our out over own same she should so
+    some than that the their them then there these they this those through to
+    too under until up very was we were what when where which while who why
+    will with would you your
+    """.split())
+
+
+def tokenize(text):
+    return [
+        word
+        for word in _WORD.findall((text or "").lower())
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def vectorize(title, description, dimensions=None):
+    """Return the unit-length float32 vector for a post's text (all zeros if empty)."""
+    import numpy as np
+
+    dimensions = dimensions or settings.SIMILAR_POSTS_DIMENSIONS
+    counts = Counter(tokenize(description))
+    for word in tokenize(title):
+        counts[word] += TITLE_WEIGHT
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word, count in counts.items():
+        # crc32, not hash(): it must agree across processes and restarts
+        hashed = zlib.crc32(word.encode())
+        sign = -1.0 if hashed & 0x80000000 else 1.0
+        vector[hashed % dimensions] += sign * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def _top_k(scores, k):
+    """Column indexes of each row's ``k`` highest scores, highest first."""
+    import numpy as np
+
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _vector_blocks(dimensions, block_size, exclude=None):
+    """Yield ``(post_ids, matrix)`` for the stored vectors, ``block_size`` at a time."""
+    import numpy as np
+
+    rows = PostVector.objects.order_by().values_list("post_id", "vector")
+    if exclude is not None:
+        rows = rows.exclude(post_id=exclude)
+    ids, vectors = [], []
+    for post_id, data in rows.iterator(chunk_size=block_size):
+        vector = np.frombuffer(data, dtype=np.float32)
+        if vector.size != dimensions:
+            # Stored before SIMILAR_POSTS_DIMENSIONS changed; a rebuild replaces it
+            continue
+        ids.append(post_id)
+        vectors.append(vector)
+        if len(ids) == block_size:
+            yield np.array(ids, dtype=np.int64), np.stack(vectors)
+            ids, vectors = [], []
+    if ids:
+        yield np.array(ids, dtype=np.int64), np.stack(vectors)
+
+
+def rebuild_similar_posts(block_size=None):
+    """
+    Recompute every post's vector and neighbours.
+
+    Returns ``(posts, links)``: the number of posts vectorised and of
+    neighbour rows written.
+    """
+    import numpy as np
+
+    dimensions = settings.SIMILAR_POSTS_DIMENSIONS
+    block_size = block_size or settings.SIMILAR_POSTS_BLOCK_SIZE
+    count = settings.SIMILAR_POSTS_COUNT
+    min_score = settings.SIMILAR_POSTS_MIN_SCORE
+
+    ids, vectors = [], []
+    texts = Post.objects.order_by("pk").values_list("pk", "title", "description")
+    for post_id, title, description in texts.iterator(chunk_size=block_size):
+        ids.append(post_id)
+        vectors.append(vectorize(title, description, dimensions))
+    matrix = np.stack(vectors) if vectors else np.zeros((0, dimensions), np.float32)
+
+    links = []
+    for start in range(0, len(ids), block_size):
+        scores = matrix[start : start + block_size] @ matrix.T
+        rows = np.arange(scores.shape[0])
+        # A post is not its own neighbour
+        scores[rows, start + rows] = -np.inf
+        for row, columns in enumerate(_top_k(scores, count)):
+            for column in columns:
+                score = float(scores[row, column])
+                if score >= min_score:
+                    links.append(
+                        SimilarPost(
+                            post_id=ids[start + row],
+                            similar_id=ids[column],
+                            score=score,
+                        )
+                    )
+
+    with transaction.atomic():
+        PostVector.objects.all().delete()
+        PostVector.objects.bulk_create(
+            [
+                PostVector(post_id=post_id, vector=vector.tobytes())
+                for post_id, vector in zip(ids, vectors)
+            ],
+            batch_size=block_size,
+        )
+        SimilarPost.objects.all().delete()
+        SimilarPost.objects.bulk_create(links, batch_size=block_size)
+    return len(ids), len(links)
+
+
+def _join_neighbour_lists(post_id, scores, count, block_size):
+    """
+    Add ``post_id`` to the list of each post in ``scores`` ({post id: score})
+    that has room for it or whose weakest neighbour scores lower.
+    """
+    others = list(scores)
+    for start in range(0, len(others), block_size):
+        chunk = others[start : start + block_size]
+        # Each list is at most ``count`` rows, so read them all in one query,
+        # weakest first, rather than aggregating and then looking each one up
+        lists = defaultdict(list)
+        rows = (
+            SimilarPost.objects.filter(post_id__in=chunk)
+            .order_by("post_id", "score", "pk")
+            .values_list("post_id", "pk", "score")
+        )
+        for other, pk, score in rows:
+            lists[other].append((pk, score))
+        full = {
+            other: neighbours[0]
+            for other, neighbours in lists.items()
+            if len(neighbours) >= count
+        }
+        replaced = [
+            other for other in chunk if other in full and scores[other] > full[other][1]
+        ]
+        SimilarPost.objects.filter(
+            pk__in=[full[other][0] for other in replaced]
+        ).delete()
+        SimilarPost.objects.bulk_create(
+            [
+                SimilarPost(post_id=other, similar_id=post_id, score=scores[other])
+                for other in chunk
+                if other not in full or other in replaced
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def index_post(post):
+    """
+    Store ``post``'s vector and neighbours, and add it to the neighbours of
+    the posts it is similar to. Returns the number of neighbours found.
+
+    This reads every stored vector once, so it costs one block of the
+    rebuild rather than all of them.
+    """
+    import numpy as np
+
+    dimensions = settings.SIMILAR_POSTS_DIMENSIONS
+    block_size = settings.SIMILAR_POSTS_BLOCK_SIZE
+    count = settings.SIMILAR_POSTS_COUNT
+    min_score = settings.SIMILAR_POSTS_MIN_SCORE
+
+    vector = vectorize(post.title, post.description, dimensions)
+    matches = {}
+    best_ids = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for ids, matrix in _vector_blocks(dimensions, block_size, exclude=post.pk):
+        scores = matrix @ vector
+        keep = scores >= min_score
+        matches.update(zip(ids[keep].tolist(), scores[keep].tolist()))
+        best_ids = np.concatenate([best_ids, ids[keep]])
+        best_scores = np.concatenate([best_scores, scores[keep]])
+        if len(best_ids) > count:
+            top = _top_k(best_scores[np.newaxis, :], count)[0]
+            best_ids, best_scores = best_ids[top], best_scores[top]
+
+    with transaction.atomic():
+        PostVector.objects.update_or_create(
+            post_id=post.pk, defaults={"vector": vector.tobytes()}
+        )
+        SimilarPost.objects.filter(post_id=post.pk).delete()
+        SimilarPost.objects.bulk_create(
+            [
+                SimilarPost(post_id=post.pk, similar_id=other, score=score)
+                for other, score in zip(best_ids.tolist(), best_scores.tolist())
+            ]
+        )
+        _join_neighbour_lists(post.pk, matches, count, block_size)
+    return len(best_ids)
+
+
+def index_missing_posts():
+    """Index every post that has no vector yet; returns how many there were."""
+    indexed = 0
+    missing = Post.objects.filter(vector__isnull=True).only("title", "description")
+    for post in missing.order_by("pk").iterator():
+        index_post(post)
+        indexed += 1
+    return indexed
+
+
+def _index_in_background(post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).only("title", "description").first()
+        if post is not None:
+            index_post(post)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning(
+            "Indexing post %s for similar posts failed", post_id, exc_info=True
+        )
+    finally:
+        # The thread had its own connection; don't leak it
+        connection.close()
+
+
+def _index_worker(posts):
+    while True:
+        post_id = posts.get()
+        try:
+            _index_in_background(post_id)
+        finally:
+            posts.task_done()
+
+
+def index_post_later(post_id):
+    """
+    Queue a new post for this process's indexing thread, off the request.
+
+    If the queue is full the post is skipped; the next incremental run of
+    ``compute_similar_posts`` picks it up.
+    """
+    global _index_queue
+    with _index_queue_lock:
+        if _index_queue is None:
+            _index_queue = queue.Queue(maxsize=settings.SIMILAR_POSTS_QUEUE_SIZE)
+            threading.Thread(
+                target=_index_worker,
+                args=(_index_queue,),
+                name="similar-posts-indexer",
+                daemon=True,
+            ).start()
+    try:
+        _index_queue.put_nowait(post_id)
+    except queue.Full:
+        logger.warning(
+            "Similar-posts queue is full; post %s waits for the next incremental run",
+            post_id,
+        )
+
+
+def get_similar_posts(post_id, limit=None):
+    """A post's stored neighbours, most similar first, with their authors."""
+    limit = limit or settings.SIMILAR_POSTS_COUNT
+    return list(
+        SimilarPost.objects.filter(post_id=post_id)
+        .select_related("similar__author")
+        .order_by("-score")[:limit]
+    )
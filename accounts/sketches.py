@@ -0,0 +1,72 @@
+"""
+A small HyperLogLog implementation for counting distinct visitors.
+
+A sketch is ``2 ** precision`` one-byte registers. With the default precision
+of 14 that is 16 KB per sketch and a standard error of about 0.8%, however
+many items are added. Sketches merge by taking the register-wise maximum, so
+partial sketches from several workers (or days) combine losslessly.
+"""
+
+import hashlib
+import math
+
+HASH_BITS = 64
+
+
+def hash64(value):
+    """Hash a string to a well-mixed 64-bit integer."""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HyperLogLog:
+    """Cardinality estimator over 64-bit hashes."""
+
+    def __init__(self, precision=14, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.size)
+        else:
+            if len(registers) != self.size:
+                raise ValueError(
+                    f"Expected {self.size} registers, got {len(registers)}."
+                )
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(precision=int(math.log2(len(data))), registers=data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add_hash(self, value):
+        """Add an item by its 64-bit hash."""
+        index = value >> (HASH_BITS - self.precision)
+        rest_bits = HASH_BITS - self.precision
+        rest = value & ((1 << rest_bits) - 1)
+        # Position of the leftmost 1-bit in the remaining bits (1-based)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, item):
+        self.add_hash(hash64(item))
+
+    def merge(self, other):
+        """Fold ``other`` into this sketch."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Estimate the number of distinct items added."""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting is exact-ish here
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
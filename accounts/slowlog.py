@@ -0,0 +1,186 @@
+"""
+Slow-query log with view and call-site attribution.
+
+``SlowQueryMiddleware`` times every statement a request runs through a
+database execute wrapper. Statements faster than ``SLOW_QUERY_THRESHOLD_MS``
+cost one timer read each and are forgotten. A slow one is logged with the
+view that ran it and the project code that issued it, e.g.
+``accounts/views.py:153 leaderboard_view > ... > accounts/caching.py:88
+<lambda>``. It is
+also added to an in-process total for its fingerprint, which is the SQL with
+literals and ``IN`` lists normalised away.
+
+Every ``SLOW_QUERY_REPORT_INTERVAL`` seconds, and when a gunicorn worker
+exits, the ``SLOW_QUERY_REPORT_SIZE`` fingerprints with the most total time
+are logged as a report and the totals start over.
+"""
+
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Execute wrappers (this one and the metrics query counter) are never the
+# call site
+_WRAPPER_FILES = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name("middleware.py")),
+}
+# Project frames shown in a call site, innermost last
+CALL_SITE_DEPTH = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", re.IGNORECASE)
+_SAVEPOINT = re.compile(
+    r'\b(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT) "?\w+"?'
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class FingerprintStats:
+    sql: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    views: dict = field(default_factory=dict)
+    sites: dict = field(default_factory=dict)
+
+    def add(self, seconds, view, site):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.views[view] = self.views.get(view, 0) + 1
+        self.sites[site] = self.sites.get(site, 0) + 1
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_last_report = time.monotonic()
+
+
+def normalize(sql):
+    """Replace literals and placeholder lists so similar statements match."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _SAVEPOINT.sub(r"\1 ?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    """Return ``(id, normalised_sql)``; the id is short enough for a log line."""
+    normalized = normalize(sql)
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=6).hexdigest()
+    return digest, normalized
+
+
+def call_site(frame=None):
+    """
+    Describe the innermost project frames (not Django or the stdlib), outermost
+    first, always starting from the view function's line when there is one.
+    """
+    frame = frame or sys._getframe(1)  # pylint: disable=protected-access
+    base = str(settings.BASE_DIR) + "/"
+    sites = []
+    view_site = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base)
+            and filename not in _WRAPPER_FILES
+            and "site-packages" not in filename
+        ):
+            site = f"{filename[len(base):]}:{frame.f_lineno} {frame.f_code.co_name}"
+            if filename.endswith("views.py"):
+                view_site = site
+            sites.append(site)
+        frame = frame.f_back
+
+    shown = sites[:CALL_SITE_DEPTH]
+    if view_site and view_site not in shown:
+        shown = sites[: CALL_SITE_DEPTH - 1] + ["...", view_site]
+    return " > ".join(reversed(shown)) or "unknown"
+
+
+def record(sql, seconds, view, site):
+    """Log one slow statement and add it to its fingerprint's totals."""
+    digest, normalized = fingerprint(sql)
+    logger.warning(
+        "Slow query %.1f ms [%s] in %s at %s: %s",
+        seconds * 1000,
+        digest,
+        view,
+        site,
+        normalized,
+    )
+    with _stats_lock:
+        stats = _stats.get(digest)
+        if stats is None:
+            stats = _stats[digest] = FingerprintStats(sql=normalized)
+        stats.add(seconds, view, site)
+
+
+class SlowQueryRecorder:
+    """A database execute wrapper that records statements over the threshold."""
+
+    def __init__(self, view, threshold):
+        self.view = view
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                record(sql, elapsed, self.view(), call_site())
+
+
+def maybe_report():
+    """Log the report if the report interval has passed."""
+    if time.monotonic() - _last_report >= settings.SLOW_QUERY_REPORT_INTERVAL:
+        report()
+
+
+def report(size=None):
+    """Log the fingerprints with the most total time and reset the totals."""
+    global _last_report  # pylint: disable=global-statement
+
+    with _stats_lock:
+        stats = dict(_stats)
+        _stats.clear()
+        _last_report = time.monotonic()
+    if not stats:
+        return []
+
+    size = size or settings.SLOW_QUERY_REPORT_SIZE
+    top = sorted(stats.items(), key=lambda item: item[1].total, reverse=True)[:size]
+    lines = [f"Slow query report: {len(stats)} fingerprints, top {len(top)}"]
+    for digest, entry in top:
+        view = max(entry.views, key=entry.views.get)
+        site = max(entry.sites, key=entry.sites.get)
+        lines.append(
+            f"[{digest}] {entry.count}x total {entry.total * 1000:.1f} ms "
+            f"max {entry.max * 1000:.1f} ms, mostly {view} at {site}: {entry.sql}"
+        )
+    logger.warning("\n  ".join(lines))
+    return top
+
+
+def report_at_exit():
+    """Report before a worker exits; called from gunicorn's worker_exit hook."""
+    try:
+        report()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not write the slow query report at exit")
@@ -0,0 +1,205 @@
+"""
+Post tags and their per-tag feeds, leaderboards and totals.
+
+Posts are tagged through ``PostTag`` rows. Each row copies the post's
+author, hours and creation time, and signals keep its like and dislike
+counts current. So "top posts in #thesis" reads the first rows of one
+``(tag, -like_count, ...)`` index, with no join or aggregate over the
+reaction tables. ``Tag.post_count`` and ``Tag.total_hours`` are running
+totals, so the tag list needs no aggregate either. ``rebuild_tag_stats``
+recomputes all of them from the source tables.
+"""
+
+import re
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Dislike, Like, Post, PostTag, Tag
+
+MAX_TAGS_PER_POST = 5
+TAG_MAX_LENGTH = Tag._meta.get_field("name").max_length
+_INVALID = re.compile(r"[^a-z0-9_-]")
+_SEPARATORS = re.compile(r"[\s,]+")
+
+SORTS = {
+    "likes": ("-like_count", "-created_at"),
+    "dislikes": ("-dislike_count", "-created_at"),
+    "time": ("-created_at", "-post"),
+}
+
+
+def normalize(name):
+    """``"#Thesis"`` -> ``"thesis"``; anything left empty or too long is None."""
+    if not isinstance(name, str):
+        return None
+    name = _INVALID.sub("", name.strip().lstrip("#").lower())
+    if not name or len(name) > TAG_MAX_LENGTH:
+        return None
+    return name
+
+
+def parse_tags(value):
+    """
+    Split comma- or space-separated tags from a form.
+
+    Returns ``(names, errors)``, with the names normalised and de-duplicated
+    in the order given.
+    """
+    if not value:
+        return [], []
+    names = []
+    errors = []
+    for raw in _SEPARATORS.split(value.strip()):
+        if not raw:
+            continue
+        name = normalize(raw)
+        if name is None:
+            errors.append(
+                f"Tag '{raw}' must be up to {TAG_MAX_LENGTH} letters, digits, "
+                "dashes or underscores."
+            )
+        elif name not in names:
+            names.append(name)
+    if len(names) > MAX_TAGS_PER_POST:
+        errors.append(f"A post can have at most {MAX_TAGS_PER_POST} tags.")
+    return names, errors
+
+
+def set_post_tags(post, names):
+    """Tag a new post with ``names`` (already normalised)."""
+    if not names:
+        return
+    with transaction.atomic():
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in names], ignore_conflicts=True
+        )
+        for tag in Tag.objects.filter(name__in=names):
+            # One at a time so the signals update the tag's totals
+            PostTag.objects.create(
+                post=post,
+                tag=tag,
+                author_id=post.author_id,
+                hours_procrastinated=post.hours_procrastinated,
+                created_at=post.created_at,
+            )
+        post.tag_names = ",".join(names)
+        Post.objects.filter(pk=post.pk).update(tag_names=post.tag_names)
+
+
+def adjust_tag(tag_id, posts, hours):
+    Tag.objects.filter(pk=tag_id).update(
+        post_count=F("post_count") + posts, total_hours=F("total_hours") + hours
+    )
+
+
+def post_changed(post_id, author_id, hours, hours_delta):
+    """Copy an edited post's author and hours into its tag rows and totals."""
+    links = PostTag.objects.filter(post_id=post_id)
+    if links.update(author_id=author_id, hours_procrastinated=hours) and hours_delta:
+        Tag.objects.filter(post_links__post_id=post_id).update(
+            total_hours=F("total_hours") + hours_delta
+        )
+
+
+def adjust_reactions(post_id, **deltas):
+    """Add ``like_count``/``dislike_count`` deltas to a post's tag rows."""
+    PostTag.objects.filter(post_id=post_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def get_top_tags(limit=None):
+    """The tags with the most posts, with their totals."""
+    limit = limit or settings.TOP_TAGS_SIZE
+    return list(Tag.objects.filter(post_count__gt=0).order_by("-post_count")[:limit])
+
+
+def _links(name):
+    return PostTag.objects.filter(tag__name=name).select_related("post__author")
+
+
+def _as_posts(links):
+    posts = []
+    for link in links:
+        post = link.post
+        post.like_count = link.like_count
+        post.dislike_count = link.dislike_count
+        posts.append(post)
+    return posts
+
+
+def get_tag_feed(name, limit, before=None):
+    """
+    The newest ``limit`` posts tagged ``name``, with reaction counts. Pass a
+    ``(created_at, post_id)`` position as ``before`` for the posts after it.
+    """
+    links = _links(name)
+    if before is not None:
+        created_at, post_id = before
+        links = links.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lt=post_id)
+        )
+    return _as_posts(links.order_by(*SORTS["time"])[:limit])
+
+
+def get_tag_leaderboard(name, sort_by, limit):
+    """The top ``limit`` posts tagged ``name`` in a ``SORTS`` order."""
+    return _as_posts(_links(name).order_by(*SORTS[sort_by])[:limit])
+
+
+def get_tag_user_leaderboard(name, limit):
+    """Users by hours procrastinated in posts tagged ``name``."""
+    return list(
+        User.objects.only("id", "username", "email")
+        .filter(tagged_posts__tag__name=name)
+        .annotate(total_hours=Sum("tagged_posts__hours_procrastinated"))
+        .order_by("-total_hours")[:limit]
+    )
+
+
+def rebuild_tag_stats():
+    """Recompute the copied fields, reaction counts and tag totals."""
+
+    def count(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(post=OuterRef("post"))
+                .order_by()
+                .values("post")
+                .annotate(n=Count("pk"))
+                .values("n")
+            ),
+            0,
+        )
+
+    with transaction.atomic():
+        post = Post.objects.filter(pk=OuterRef("post"))
+        PostTag.objects.update(
+            author_id=Subquery(post.values("author_id")),
+            hours_procrastinated=Subquery(post.values("hours_procrastinated")),
+            created_at=Subquery(post.values("created_at")),
+            like_count=count(Like),
+            dislike_count=count(Dislike),
+        )
+        for tag in Tag.objects.annotate(
+            actual_posts=Count("post_links"),
+            actual_hours=Coalesce(Sum("post_links__hours_procrastinated"), Decimal(0)),
+        ).filter(~Q(post_count=F("actual_posts")) | ~Q(total_hours=F("actual_hours"))):
+            Tag.objects.filter(pk=tag.pk).update(
+                post_count=tag.actual_posts, total_hours=tag.actual_hours
+            )
+        tagged = Post.objects.filter(Q(tag_links__isnull=False) | ~Q(tag_names=""))
+        for post_id in tagged.values_list("pk", flat=True).distinct().iterator():
+            names = ",".join(
+                PostTag.objects.filter(post_id=post_id)
+                .order_by("pk")
+                .values_list("tag__name", flat=True)
+            )
+            Post.objects.filter(pk=post_id).exclude(tag_names=names).update(
+                tag_names=names
+            )
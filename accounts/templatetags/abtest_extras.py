@@ -0,0 +1,19 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def percent(value, digits=2):
+    """Format a fraction such as 0.1234 as "12.34%"; blank for None."""
+    if value is None:
+        return "–"
+    return f"{value * 100:.{digits}f}%"
+
+
+@register.filter
+def pvalue(value):
+    """Format a p-value to four decimal places; blank for None."""
+    if value is None:
+        return "–"
+    return "<0.0001" if value < 0.0001 else f"{value:.4f}"
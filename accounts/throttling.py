@@ -0,0 +1,97 @@
+"""
+Per-view request throttling backed by the shared cache.
+
+Each scope in ``settings.RATE_LIMITS`` allows ``<count>/<period>`` requests per
+client. Usage is measured with a sliding-window counter: the hits in the
+current fixed window plus the previous window's hits, weighted by how much of
+that window still falls inside the sliding period. Counters only use
+``cache.add``/``cache.incr``, which are atomic in both LocMem and Redis, so with
+REDIS_URL set every gunicorn worker enforces the same limit.
+"""
+
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .utils import get_client_ip
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Turn ``"30/m"`` into ``(30, 60)``."""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period.strip().lower()[0]]
+
+
+def client_key(request, by):
+    """Identify the client by user id (``by="user"``) or by IP address."""
+    if by == "user" and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{get_client_ip(request)}"
+
+
+def hit(scope, ident, limit, period, now=None):
+    """
+    Record one request for ``ident`` unless it is over the limit.
+
+    Returns ``(allowed, retry_after_seconds)``.
+    """
+    now = time.time() if now is None else now
+    window = int(now // period)
+    key = f"throttle:{scope}:{ident}:{window}"
+    previous_key = f"throttle:{scope}:{ident}:{window - 1}"
+
+    counts = cache.get_many([key, previous_key])
+    current = counts.get(key, 0)
+    previous = counts.get(previous_key, 0)
+    elapsed = now - window * period
+    if previous * (period - elapsed) / period + current >= limit:
+        if current >= limit or not previous:
+            # Nothing frees up until this window ends
+            wait = period - elapsed
+        else:
+            # Wait until enough of the previous window has slid out of view
+            wait = period * (1 - (limit - current) / previous) - elapsed
+        return False, max(1, math.ceil(wait))
+
+    # Counters outlive their window so they can be read as the "previous" one
+    if not cache.add(key, 1, timeout=period * 2):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=period * 2)
+    return True, 0
+
+
+def rate_limit(scope, by="ip"):
+    """
+    Throttle a view with the ``settings.RATE_LIMITS[scope]`` rate.
+
+    The check runs before the view, so rejected requests cost no ORM work
+    (``by="user"`` reads ``request.user``, so stack it under
+    ``@login_required``). A missing or empty rate disables the scope.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            rate = settings.RATE_LIMITS.get(scope)
+            if rate:
+                limit, period = parse_rate(rate)
+                allowed, retry_after = hit(
+                    scope, client_key(request, by), limit, period
+                )
+                if not allowed:
+                    response = JsonResponse({"error": "Too many requests"}, status=429)
+                    response["Retry-After"] = str(retry_after)
+                    return response
+            return view_func(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,210 @@
+"""
+Personalized home timelines with fan-out on write.
+
+When someone posts, a ``TimelineEntry`` row is written for each of their
+followers, so reading a timeline is one indexed range scan per page, however
+many people the reader follows. Authors with more than
+``TIMELINE_FANOUT_MAX_FOLLOWERS`` followers aren't fanned out, because one
+post would mean too many writes. Readers pull those authors' posts, and
+their own, straight from the post author index and merge them into the page.
+Every page takes the same four queries.
+
+Timelines are trimmed to ``TIMELINE_MAX_LENGTH`` entries by the
+``trim_timelines`` command. Older posts are still on the global feed and on
+each author's profile.
+
+The global feed's first page is the cached feed head (see ``caching``).
+``get_feed_page`` reads the pages after it from the database, with the same
+``(created_at, id)`` keyset cursors.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import tags
+from .models import Dislike, Follow, Like, Post, TimelineEntry, UserStats
+from .profiles import decode_cursor, encode_cursor
+from .queries import reaction_count
+
+INSERT_BATCH_SIZE = 1000
+
+
+def is_fanned_out(follower_count):
+    return follower_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_posts(posts):
+    """
+    Push new posts into their authors' followers' timelines.
+
+    Posts by authors over the fan-out limit are skipped (they are pulled at
+    read time). Returns the number of timeline entries written.
+    """
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+
+    # One query for the followers of every author under the limit
+    follows = Follow.objects.filter(
+        followee_id__in=by_author,
+        followee__stats__follower_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values_list("followee_id", "follower_id")
+    entries = [
+        TimelineEntry(
+            user_id=follower_id,
+            post_id=post.pk,
+            author_id=author_id,
+            created_at=post.created_at,
+        )
+        for author_id, follower_id in follows
+        for post in by_author[author_id]
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def backfill(follower_id, followee_id):
+    """Copy a newly followed author's recent posts into the follower's timeline."""
+    stats = UserStats.objects.filter(user_id=followee_id).first()
+    if stats is not None and not is_fanned_out(stats.follower_count):
+        return 0
+    recent = Post.objects.filter(author_id=followee_id).order_by("-created_at", "-id")[
+        : settings.TIMELINE_BACKFILL_SIZE
+    ]
+    entries = [
+        TimelineEntry(
+            user_id=follower_id,
+            post_id=post_id,
+            author_id=followee_id,
+            created_at=created_at,
+        )
+        for post_id, created_at in recent.values_list("id", "created_at")
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def remove(follower_id, followee_id):
+    """Drop an unfollowed author's posts from the follower's timeline."""
+    return TimelineEntry.objects.filter(
+        user_id=follower_id, author_id=followee_id
+    ).delete()[0]
+
+
+def trim_timelines(max_length=None):
+    """Delete entries beyond the newest ``max_length`` in every timeline."""
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    deleted = 0
+    users = (
+        TimelineEntry.objects.values_list("user_id", flat=True).order_by().distinct()
+    )
+    for user_id in users.iterator():
+        cutoff = (
+            TimelineEntry.objects.filter(user_id=user_id)
+            .order_by("-created_at", "-post_id")
+            .values_list("created_at", "post_id")[max_length : max_length + 1]
+        )
+        cutoff = list(cutoff)
+        if cutoff:
+            created_at, post_id = cutoff[0]
+            deleted += (
+                TimelineEntry.objects.filter(user_id=user_id)
+                .filter(
+                    Q(created_at__lt=created_at)
+                    | Q(created_at=created_at, post_id__lte=post_id)
+                )
+                .delete()[0]
+            )
+    return deleted
+
+
+def _before(cursor, created_field, id_field):
+    created_at, pk = cursor
+    return Q(**{f"{created_field}__lt": created_at}) | Q(
+        **{created_field: created_at, f"{id_field}__lt": pk}
+    )
+
+
+def get_timeline_page(user, cursor=None, page_size=None):
+    """
+    Return ``(posts, next_cursor)`` for the user's home timeline.
+
+    Posts are newest first and annotated like the global feed, with author,
+    ``like_count`` and ``dislike_count``.
+    """
+    page_size = page_size or settings.FEED_HEAD_SIZE
+    position = decode_cursor(cursor) if cursor else None
+
+    # Authors read on demand: the user and anyone too big to fan out
+    pulled_authors = [user.pk]
+    pulled_authors.extend(
+        Follow.objects.filter(
+            follower=user,
+            followee__stats__follower_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        ).values_list("followee_id", flat=True)
+    )
+
+    pushed = TimelineEntry.objects.filter(user=user)
+    pulled = Post.objects.filter(author_id__in=pulled_authors)
+    if position is not None:
+        pushed = pushed.filter(_before(position, "created_at", "post_id"))
+        pulled = pulled.filter(_before(position, "created_at", "id"))
+
+    candidates = set(
+        pushed.order_by("-created_at", "-post_id").values_list("created_at", "post_id")[
+            : page_size + 1
+        ]
+    )
+    candidates.update(
+        pulled.order_by("-created_at", "-id").values_list("created_at", "id")[
+            : page_size + 1
+        ]
+    )
+    page = sorted(candidates, reverse=True)[: page_size + 1]
+
+    post_ids = [post_id for _, post_id in page[:page_size]]
+    posts_by_id = (
+        Post.objects.select_related("author")
+        .annotate(
+            like_count=reaction_count(Like), dislike_count=reaction_count(Dislike)
+        )
+        .in_bulk(post_ids)
+    )
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    next_cursor = None
+    if len(page) > page_size and posts:
+        next_cursor = encode_cursor(posts[-1])
+    return posts, next_cursor
+
+
+def get_feed_page(cursor, tag=None, page_size=None):
+    """
+    Return ``(posts, next_cursor)`` for everyone's posts, or those tagged
+    ``tag``, older than ``cursor``.
+
+    Each page is one keyset range scan, so the thousandth page costs the same
+    as the second. A malformed cursor starts from the newest post.
+    """
+    page_size = page_size or settings.FEED_HEAD_SIZE
+    position = decode_cursor(cursor) if cursor else None
+    if tag:
+        page = tags.get_tag_feed(tag, page_size + 1, before=position)
+    else:
+        posts = (
+            Post.objects.select_related("author")
+            .annotate(
+                like_count=reaction_count(Like), dislike_count=reaction_count(Dislike)
+            )
+            .order_by("-created_at", "-id")
+        )
+        if position is not None:
+            posts = posts.filter(_before(position, "created_at", "id"))
+        page = list(posts[: page_size + 1])
+
+    posts = page[:page_size]
+    next_cursor = encode_cursor(posts[-1]) if len(page) > page_size else None
+    return posts, next_cursor
@@ -11,13 +11,27 @@ urlpatterns = [
     path("create-post/", views.create_post_view, name="create_post"),
     path("leaderboard/", views.leaderboard_view, name="leaderboard"),
     path("user-leaderboard/", views.user_leaderboard_view, name="user_leaderboard"),
+    path("users/<str:username>/", views.profile_view, name="profile"),
+    path("api/users/<str:username>/", views.profile_api_view, name="profile_api"),
+    path("users/<str:username>/follow/", views.follow_view, name="follow"),
     path("like-post/<int:post_id>/", views.like_post_view, name="like_post"),
     path("dislike-post/<int:post_id>/", views.dislike_post_view, name="dislike_post"),
+    path("comment-post/<int:post_id>/", views.comment_post_view, name="comment_post"),
+    path(
+        "post-comments/<int:post_id>/", views.post_comments_view, name="post_comments"
+    ),
+    path(
+        "similar-posts/<int:post_id>/", views.similar_posts_view, name="similar_posts"
+    ),
     path("check-new-posts/", views.check_new_posts_view, name="check_new_posts"),
+    path("post-counts/", views.post_counts_view, name="post_counts"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("api/posts/import/", views.import_posts_view, name="import_posts"),
     path("d92e206/", views.abtest_view, name="abtest"),
     path(
         "d92e206/track-click/",
         views.abtest_button_click_view,
         name="abtest_button_click",
     ),
+    path("d92e206/results/", views.abtest_results_view, name="abtest_results"),
 ]
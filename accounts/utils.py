@@ -0,0 +1,20 @@
+from django.conf import settings
+
+
+def get_client_ip(request):
+    """
+    Get the client's IP address from the request.
+
+    Each of the ``TRUSTED_PROXY_COUNT`` proxies in front of the app appends
+    the address it received the request from to X-Forwarded-For, so the
+    client is that many entries from the right. Anything further left was
+    sent by the client and can't be trusted. With no proxies configured the
+    header is ignored.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if proxies and x_forwarded_for:
+        hops = [hop.strip() for hop in x_forwarded_for.split(",")]
+        # A shorter header didn't pass through every proxy; use the leftmost
+        return hops[-min(proxies, len(hops))]
+    return request.META.get("REMOTE_ADDR")
@@ -0,0 +1,63 @@
+"""
+Validation rules for posts, shared by the create form and the bulk importer.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from .models import Post
+
+TITLE_MAX_LENGTH = Post._meta.get_field("title").max_length
+# hours_procrastinated is DecimalField(max_digits=5, decimal_places=2)
+MAX_HOURS = Decimal("999.99")
+HOURS_QUANTUM = Decimal("0.01")
+
+
+def validate_post(title, description, hours_procrastinated):
+    """
+    Check the user-supplied fields of a post.
+
+    Returns ``(cleaned, errors)``: ``cleaned`` holds ``title``,
+    ``description`` and ``hours_procrastinated`` (a Decimal) when ``errors``
+    is empty.
+    """
+    errors = []
+    title = title.strip() if isinstance(title, str) else title
+    description = description.strip() if isinstance(description, str) else description
+
+    if not title:
+        errors.append("Title is required.")
+    elif not isinstance(title, str):
+        errors.append("Title must be text.")
+    elif len(title) > TITLE_MAX_LENGTH:
+        errors.append(f"Title must be at most {TITLE_MAX_LENGTH} characters.")
+
+    if not description:
+        errors.append("Description is required.")
+    elif not isinstance(description, str):
+        errors.append("Description must be text.")
+
+    hours = None
+    if hours_procrastinated in (None, ""):
+        errors.append("Hours procrastinated is required.")
+    else:
+        try:
+            hours = Decimal(str(hours_procrastinated))
+            if not hours.is_finite():
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errors.append("Hours procrastinated must be a valid number.")
+        else:
+            # Bounds first: quantizing a huge value overflows the context
+            if hours < 0:
+                errors.append("Hours procrastinated must be a positive number.")
+            elif hours > MAX_HOURS or hours.quantize(HOURS_QUANTUM) > MAX_HOURS:
+                errors.append(f"Hours procrastinated must be at most {MAX_HOURS}.")
+            else:
+                hours = hours.quantize(HOURS_QUANTUM)
+
+    cleaned = {
+        "title": title,
+        "description": description,
+        "hours_procrastinated": hours,
+    }
+    return cleaned, errors
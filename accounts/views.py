@@ -1,15 +1,45 @@
-import random
+import logging
 
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Count, Q, Sum
-from django.http import JsonResponse
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-
-from .models import ABTestButtonClick, ABTestPageView, Dislike, Like, Post
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+
+from . import (
+    abtesting,
+    caching,
+    comments,
+    importing,
+    metrics,
+    profiles,
+    similarity,
+    tags,
+    timelines,
+)
+from .models import (
+    ABTestButtonClick,
+    Comment,
+    Dislike,
+    Follow,
+    Like,
+    Post,
+)
+from .responses import FastJsonResponse
+from .throttling import rate_limit
+from .utils import get_client_ip
+from .validation import validate_post
+
+logger = logging.getLogger(__name__)
 
 
 def login_view(request):
@@ -79,14 +109,51 @@ def signup_view(request):
     return render(request, "accounts/signup.html")
 
 
+def _mark_stale(response, snapshot):
+    """Flag a page built from an out-of-date snapshot (see caching.py)."""
+    if snapshot is not None and snapshot.stale:
+        response["X-Stale-Since"] = snapshot.stale_since.isoformat()
+        patch_cache_control(response, no_store=True)
+    return response
+
+
 @login_required
 def home_view(request):
-    """Home page feed showing all posts."""
-    posts = (
-        Post.objects.all()
-        .annotate(like_count=Count("likes"), dislike_count=Count("dislikes"))
-        .order_by("-created_at")
-    )
+    """
+    Home page feed: posts from followed users, or everyone's posts for users
+    who follow nobody (or ask for ``?feed=everyone``). ``?tag=`` shows
+    everyone's posts with that tag. Follow ``?cursor=`` for older posts.
+    """
+    feed = request.GET.get("feed")
+    tag = tags.normalize(request.GET.get("tag"))
+    cursor = request.GET.get("cursor")
+    snapshot = None
+    if not tag and (
+        feed == "following"
+        or feed != "everyone"
+        and Follow.objects.filter(follower=request.user).exists()
+    ):
+        feed = "following"
+        try:
+            with caching.statement_timeout(settings.STATEMENT_TIMEOUTS_MS.get("home")):
+                posts, next_cursor = timelines.get_timeline_page(
+                    request.user, cursor=cursor
+                )
+        except DatabaseError:
+            logger.warning("Timeline unavailable, showing everyone", exc_info=True)
+            feed = "everyone"
+            cursor = None
+    if feed != "following":
+        feed = "everyone"
+        if cursor:
+            # Past the cached head: read older pages straight from the database
+            with caching.statement_timeout(settings.STATEMENT_TIMEOUTS_MS.get("home")):
+                posts, next_cursor = timelines.get_feed_page(cursor, tag)
+        else:
+            snapshot = caching.get_feed_head(tag)
+            posts, next_cursor = snapshot.value, None
+            if len(posts) >= settings.FEED_HEAD_SIZE:
+                next_cursor = profiles.encode_cursor(posts[-1])
 
     # Get which posts the current user has liked/disliked
     user_liked_posts = set(
@@ -100,48 +167,35 @@ def home_view(request):
         "posts": posts,
         "user_liked_posts": user_liked_posts,
         "user_disliked_posts": user_disliked_posts,
+        "feed": feed,
+        "current_tag": tag,
+        "next_cursor": next_cursor,
+        "stale_since": snapshot and snapshot.stale_since,
         "active_tab": "home",
     }
-    return render(request, "accounts/home.html", context)
+    return _mark_stale(render(request, "accounts/home.html", context), snapshot)
 
 
 @login_required
 def create_post_view(request):
     """Create a new post."""
     if request.method == "POST":
-        title = request.POST.get("title")
-        description = request.POST.get("description")
-        hours_procrastinated = request.POST.get("hours_procrastinated")
-
-        # Validation
-        errors = []
-
-        if not title:
-            errors.append("Title is required.")
-
-        if not description:
-            errors.append("Description is required.")
-
-        if not hours_procrastinated:
-            errors.append("Hours procrastinated is required.")
-        else:
-            try:
-                hours = float(hours_procrastinated)
-                if hours < 0:
-                    errors.append("Hours procrastinated must be a positive number.")
-            except ValueError:
-                errors.append("Hours procrastinated must be a valid number.")
+        # Same rules as the bulk importer (see validation.py)
+        cleaned, errors = validate_post(
+            request.POST.get("title"),
+            request.POST.get("description"),
+            request.POST.get("hours_procrastinated"),
+        )
+        tag_names, tag_errors = tags.parse_tags(request.POST.get("tags"))
+        errors += tag_errors
 
         if errors:
             for error in errors:
                 messages.error(request, error)
         else:
-            post = Post.objects.create(
-                title=title,
-                description=description,
-                hours_procrastinated=hours_procrastinated,
-                author=request.user,
-            )
+            with transaction.atomic():
+                post = Post.objects.create(author=request.user, **cleaned)
+                tags.set_post_tags(post, tag_names)
             messages.success(request, "Post created successfully!")
             return redirect("home")
 
@@ -155,43 +209,127 @@ def create_post_view(request):
 def leaderboard_view(request):
     """Leaderboard showing posts with filtering options."""
     sort_by = request.GET.get("sort", "likes")  # Default: sort by likes
+    tag = tags.normalize(request.GET.get("tag"))
 
-    posts = Post.objects.annotate(
-        like_count=Count("likes"), dislike_count=Count("dislikes")
-    )
-
-    if sort_by == "time":
-        posts = posts.order_by("-created_at")
-    elif sort_by == "dislikes":
-        posts = posts.order_by("-dislike_count", "-created_at")
-    else:  # Default: sort by likes
-        posts = posts.order_by("-like_count", "-created_at")
+    snapshot = caching.get_post_leaderboard(sort_by, tag)
 
     context = {
-        "posts": posts,
+        "posts": snapshot.value,
+        "top_tags": caching.get_top_tags().value,
+        "current_tag": tag,
+        "stale_since": snapshot.stale_since,
         "active_tab": "leaderboard",
         "current_sort": sort_by,
     }
-    return render(request, "accounts/leaderboard.html", context)
+    return _mark_stale(render(request, "accounts/leaderboard.html", context), snapshot)
 
 
 @login_required
 def user_leaderboard_view(request):
-    """Leaderboard showing users ranked by total hours procrastinated."""
-    users = (
-        User.objects.annotate(total_hours=Sum("posts__hours_procrastinated"))
-        .filter(total_hours__isnull=False)
-        .order_by("-total_hours")
-    )
+    """Users ranked by total hours procrastinated, optionally within a tag."""
+    tag = tags.normalize(request.GET.get("tag"))
+    snapshot = caching.get_user_leaderboard(tag)
 
     context = {
-        "users": users,
+        "users": snapshot.value,
+        "top_tags": caching.get_top_tags().value,
+        "current_tag": tag,
+        "stale_since": snapshot.stale_since,
         "active_tab": "user_leaderboard",
     }
-    return render(request, "accounts/user_leaderboard.html", context)
+    return _mark_stale(
+        render(request, "accounts/user_leaderboard.html", context), snapshot
+    )
+
+
+def _profile_data(request, username):
+    profile_user = get_object_or_404(
+        User.objects.only("id", "username", "date_joined"), username=username
+    )
+    stats = profiles.get_user_stats(profile_user)
+    posts, next_cursor = profiles.get_posts_page(
+        profile_user, cursor=request.GET.get("cursor")
+    )
+    return profile_user, stats, posts, next_cursor
+
+
+@login_required
+def profile_view(request, username):
+    """A user's totals, rank and posts, newest first."""
+    profile_user, stats, posts, next_cursor = _profile_data(request, username)
+
+    context = {
+        "profile_user": profile_user,
+        "stats": stats,
+        "rank": profiles.get_rank(stats),
+        "is_following": Follow.objects.filter(
+            follower=request.user, followee=profile_user
+        ).exists(),
+        "posts": posts,
+        "next_cursor": next_cursor,
+        "active_tab": "profile" if profile_user == request.user else None,
+    }
+    return render(request, "accounts/profile.html", context)
+
+
+@login_required
+def profile_api_view(request, username):
+    """JSON version of the profile page; follow ``next_cursor`` for more posts."""
+    profile_user, stats, posts, next_cursor = _profile_data(request, username)
+
+    data = {
+        "user": {
+            "username": profile_user.username,
+            "date_joined": profile_user.date_joined.isoformat(),
+        },
+        "stats": {field: getattr(stats, field) for field in profiles.STAT_FIELDS},
+        "posts": [
+            {
+                "id": post.id,
+                "title": post.title,
+                "description": post.description,
+                "hours_procrastinated": float(post.hours_procrastinated),
+                "created_at": post.created_at.isoformat(),
+                "like_count": post.like_count,
+                "dislike_count": post.dislike_count,
+                "comment_count": post.comment_count,
+            }
+            for post in posts
+        ],
+        "next_cursor": next_cursor,
+    }
+    data["stats"]["total_hours"] = float(stats.total_hours)
+    data["stats"]["rank"] = profiles.get_rank(stats)
+    return FastJsonResponse(data)
+
+
+@login_required
+@rate_limit("follows", by="user")
+def follow_view(request, username):
+    """Follow or unfollow a user."""
+    if request.method == "POST":
+        followee = get_object_or_404(User, username=username)
+        if followee == request.user:
+            return JsonResponse({"error": "You can't follow yourself"}, status=400)
+
+        follow, created = Follow.objects.get_or_create(
+            follower=request.user, followee=followee
+        )
+        if not created:
+            follow.delete()
+
+        return JsonResponse(
+            {
+                "following": created,
+                "follower_count": profiles.get_user_stats(followee).follower_count,
+            }
+        )
+
+    return JsonResponse({"error": "Invalid request"}, status=400)
 
 
 @login_required
+@rate_limit("reactions", by="user")
 def like_post_view(request, post_id):
     """Like or unlike a post. Ensures mutual exclusivity with dislikes."""
     if request.method == "POST":
@@ -211,6 +349,7 @@ def like_post_view(request, post_id):
         else:
             # Like: created a new like
             liked = True
+        metrics.REACTION_TOGGLES.labels("like", "add" if liked else "remove").inc()
 
         # Get updated counts
         like_count = post.get_like_count()
@@ -229,6 +368,7 @@ def like_post_view(request, post_id):
 
 
 @login_required
+@rate_limit("reactions", by="user")
 def dislike_post_view(request, post_id):
     """Dislike or undislike a post. Ensures mutual exclusivity with likes."""
     if request.method == "POST":
@@ -248,6 +388,9 @@ def dislike_post_view(request, post_id):
         else:
             # Dislike: created a new dislike
             disliked = True
+        metrics.REACTION_TOGGLES.labels(
+            "dislike", "add" if disliked else "remove"
+        ).inc()
 
         # Get updated counts
         like_count = post.get_like_count()
@@ -265,6 +408,101 @@ def dislike_post_view(request, post_id):
     return JsonResponse({"error": "Invalid request"}, status=400)
 
 
+def _comment_data(comment):
+    return {
+        "id": comment.id,
+        "parent_id": comment.parent_id,
+        "depth": comment.depth,
+        "author": comment.author.username,
+        "body": comment.body,
+        "created_at": comment.created_at.isoformat(),
+    }
+
+
+@login_required
+def post_comments_view(request, post_id):
+    """
+    A post's comments, depth-first; ``?root=<comment id>`` limits them to one
+    comment and its replies. Follow ``next_cursor`` for more.
+    """
+    post = get_object_or_404(Post.objects.only("id", "comment_count"), id=post_id)
+    cursor = request.GET.get("cursor")
+    root = request.GET.get("root")
+    if root:
+        if not root.isdigit():
+            return JsonResponse({"error": "Invalid root"}, status=400)
+        page, next_cursor = comments.get_subtree_page(post.id, int(root), cursor)
+    else:
+        page, next_cursor = comments.get_thread_page(post.id, cursor)
+
+    return FastJsonResponse(
+        {
+            "comment_count": post.comment_count,
+            "comments": [_comment_data(comment) for comment in page],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@login_required
+def similar_posts_view(request, post_id):
+    """The posts whose text is most like a post's, most similar first."""
+    post = get_object_or_404(Post.objects.only("id"), id=post_id)
+    return FastJsonResponse(
+        {
+            "post_id": post.id,
+            "similar": [
+                {
+                    "id": link.similar.id,
+                    "title": link.similar.title,
+                    "author": link.similar.author.username,
+                    "hours_procrastinated": str(link.similar.hours_procrastinated),
+                    "score": round(link.score, 3),
+                }
+                for link in similarity.get_similar_posts(post.id)
+            ],
+        }
+    )
+
+
+@login_required
+@rate_limit("comments", by="user")
+def comment_post_view(request, post_id):
+    """Comment on a post, or reply to a comment with ``parent``."""
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    post = get_object_or_404(Post.objects.only("id"), id=post_id)
+    body, error = comments.validate_body(request.POST.get("body"))
+    parent = None
+    parent_id = request.POST.get("parent")
+    if not error and parent_id:
+        parent = (
+            Comment.objects.filter(post=post, id=parent_id)
+            .only("id", "path", "depth")
+            .first()
+            if parent_id.isdigit()
+            else None
+        )
+        if parent is None:
+            error = "Unknown parent comment."
+        elif parent.depth + 1 >= settings.COMMENT_MAX_DEPTH:
+            error = f"Replies can only be nested {settings.COMMENT_MAX_DEPTH} deep."
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    comment = comments.add_comment(post, request.user, body, parent=parent)
+    return JsonResponse(
+        {
+            "comment": _comment_data(comment),
+            "comment_count": Post.objects.values_list("comment_count", flat=True).get(
+                id=post.id
+            ),
+        },
+        status=201,
+    )
+
+
 @login_required
 def check_new_posts_view(request):
     """API endpoint to check for new posts since a given timestamp."""
@@ -282,11 +520,25 @@ def check_new_posts_view(request):
                     since_datetime = timezone.make_aware(since_datetime)
                 posts = (
                     Post.objects.filter(created_at__gt=since_datetime)
+                    .select_related("author")
                     .annotate(
-                        like_count=Count("likes"), dislike_count=Count("dislikes")
+                        like_count=Count("likes", distinct=True),
+                        dislike_count=Count("dislikes", distinct=True),
                     )
                     .order_by("-created_at")
                 )
+                tag = tags.normalize(request.GET.get("tag"))
+                if tag:
+                    posts = posts.filter(tag_links__tag__name=tag)
+                elif request.GET.get("feed") == "following":
+                    # A subquery, not a join: joining Follow would multiply
+                    # the reaction counts by the author's follower count
+                    followees = Follow.objects.filter(follower=request.user).values(
+                        "followee_id"
+                    )
+                    posts = posts.filter(
+                        Q(author=request.user) | Q(author_id__in=followees)
+                    )
             except (ValueError, AttributeError, TypeError):
                 # Fallback: return no posts if parsing fails
                 posts = Post.objects.none()
@@ -305,6 +557,8 @@ def check_new_posts_view(request):
                     "created_at": post.created_at.isoformat(),
                     "like_count": post.like_count,
                     "dislike_count": post.dislike_count,
+                    "comment_count": post.comment_count,
+                    "tags": post.tag_list,
                 }
             )
 
@@ -313,50 +567,117 @@ def check_new_posts_view(request):
     return JsonResponse({"error": "Invalid request"}, status=400)
 
 
-def abtest_view(request):
-    """A/B test endpoint showing team nicknames and a randomized button."""
-    # Randomly choose between Variant A ("kudos") and Variant B ("thanks")
-    variant = random.choice(["A", "B"])
-    button_text = "kudos" if variant == "A" else "thanks"
-
-    # Track page view
-    ABTestPageView.objects.create(
-        variant=variant,
-        ip_address=get_client_ip(request),
-        user_agent=request.META.get("HTTP_USER_AGENT", ""),
-    )
+POST_COUNT_FIELDS = ("likes", "dislikes", "reaction")
+MAX_POST_COUNT_IDS = 100
 
-    team_nicknames = [
-        "enthusiastic-partridge",
-        "sparkling-raccoon",
-        "aggressive-grouse",
-        "happy-stingray",
-    ]
 
-    context = {
-        "team_nicknames": team_nicknames,
-        "button_text": button_text,
-        "variant": variant,
-    }
-    return render(request, "accounts/abtest.html", context)
+def _parse_csv(value):
+    return [item for item in (value or "").split(",") if item]
 
 
-def get_client_ip(request):
-    """Get the client's IP address from the request."""
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(",")[0]
+@login_required
+def post_counts_view(request):
+    """
+    API endpoint returning current counts for a batch of posts in one query.
+
+    ``?ids=3,2,1`` selects the posts (at most ``MAX_POST_COUNT_IDS``) and
+    ``&fields=likes,reaction`` optionally limits the columns. The response is
+    ``{"fields": [...], "counts": {"<id>": [value, ...]}}`` with values in
+    field order; ``reaction`` is 1 (liked), -1 (disliked) or 0.
+    """
+    if request.method == "GET":
+        try:
+            post_ids = [int(post_id) for post_id in _parse_csv(request.GET.get("ids"))]
+        except ValueError:
+            return JsonResponse({"error": "Invalid post ids"}, status=400)
+        if len(post_ids) > MAX_POST_COUNT_IDS:
+            return JsonResponse(
+                {"error": f"At most {MAX_POST_COUNT_IDS} posts per request"},
+                status=400,
+            )
+
+        fields = _parse_csv(request.GET.get("fields")) or list(POST_COUNT_FIELDS)
+        if any(field not in POST_COUNT_FIELDS for field in fields):
+            return JsonResponse({"error": "Invalid fields"}, status=400)
+
+        annotations = {}
+        if "likes" in fields:
+            annotations["like_count"] = Count("likes", distinct=True)
+        if "dislikes" in fields:
+            annotations["dislike_count"] = Count("dislikes", distinct=True)
+        if "reaction" in fields:
+            annotations["liked"] = Exists(
+                Like.objects.filter(user=request.user, post=OuterRef("pk"))
+            )
+            annotations["disliked"] = Exists(
+                Dislike.objects.filter(user=request.user, post=OuterRef("pk"))
+            )
+
+        counts = {}
+        if post_ids:
+            rows = (
+                Post.objects.filter(id__in=post_ids)
+                .order_by()
+                .annotate(**annotations)
+                .values("id", *annotations)
+            )
+            for row in rows:
+                values = {
+                    "likes": row.get("like_count"),
+                    "dislikes": row.get("dislike_count"),
+                    "reaction": (
+                        1 if row.get("liked") else -1 if row.get("disliked") else 0
+                    ),
+                }
+                counts[str(row["id"])] = [values[field] for field in fields]
+
+        return FastJsonResponse({"fields": fields, "counts": counts})
+
+    return JsonResponse({"error": "Invalid request"}, status=400)
+
+
+@rate_limit("abtest")
+def abtest_view(request):
+    """A/B test endpoint showing team nicknames and a per-visitor button."""
+    # Sticky assignment: the same visitor always hashes to the same variant
+    visitor, is_new = abtesting.visitor_key(request)
+    variant = abtesting.assign_variant(visitor)
+
+    # Track page view (unique-visitor sketch, plus a row unless deduplicated)
+    abtesting.record_page_view(request, variant)
+
+    if request.user.is_authenticated or len(messages.get_messages(request)):
+        # The navigation and flash messages are per user; render them live
+        context = {
+            "team_nicknames": abtesting.TEAM_NICKNAMES,
+            "button_text": settings.AB_TEST_VARIANTS[variant],
+            "variant": variant,
+        }
+        response = render(request, abtesting.PAGE_TEMPLATE, context)
     else:
-        ip = request.META.get("REMOTE_ADDR")
-    return ip
+        response = HttpResponse(abtesting.get_variant_page(variant))
+
+    # The cached page has no CSRF token; the click script reads the cookie
+    get_token(request)
+    patch_cache_control(response, private=True)
+    if is_new:
+        response.set_cookie(
+            abtesting.VISITOR_COOKIE,
+            visitor,
+            max_age=abtesting.VISITOR_COOKIE_AGE,
+            samesite="Lax",
+            secure=request.is_secure(),
+        )
+    return response
 
 
+@rate_limit("abtest_click")
 def abtest_button_click_view(request):
     """Track button clicks for the A/B test."""
     if request.method == "POST":
         variant = request.POST.get("variant")
 
-        if variant not in ["A", "B"]:
+        if variant not in settings.AB_TEST_VARIANTS:
             return JsonResponse({"error": "Invalid variant"}, status=400)
 
         # Track button click
@@ -365,17 +686,79 @@ def abtest_button_click_view(request):
             ip_address=get_client_ip(request),
             user_agent=request.META.get("HTTP_USER_AGENT", ""),
         )
+        abtesting.log_event("click", variant)
 
-        # Get total click counts by variant
-        click_count_a = ABTestButtonClick.get_click_count_by_variant("A")
-        click_count_b = ABTestButtonClick.get_click_count_by_variant("B")
+        # Get total click counts by variant (cached, kept current by signals)
+        click_totals = caching.get_ab_click_totals()
 
         return JsonResponse(
             {
                 "success": True,
-                "click_count_a": click_count_a,
-                "click_count_b": click_count_b,
+                "click_count_a": click_totals.get("A", 0),
+                "click_count_b": click_totals.get("B", 0),
+                "click_counts": click_totals,
             }
         )
 
     return JsonResponse({"error": "Invalid request method"}, status=400)
+
+
+IMPORT_FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+@staff_member_required
+def import_posts_view(request):
+    """Bulk-create posts from a JSON array or NDJSON request body."""
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    fmt = IMPORT_FORMATS.get(request.content_type)
+    if fmt is None:
+        return JsonResponse(
+            {"error": "Content-Type must be application/json or application/x-ndjson"},
+            status=415,
+        )
+
+    # Read the body as a stream instead of request.body, so large imports
+    # never sit in memory (or hit DATA_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        result = importing.import_posts(
+            importing.iter_records(request, fmt), default_author=request.user
+        )
+    except importing.ImportFormatError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return FastJsonResponse(result.as_dict())
+
+
+@staff_member_required
+def abtest_results_view(request):
+    """Staff dashboard with conversion statistics for the A/B test."""
+    # NumPy is only needed here, so keep it out of every worker's startup
+    from . import abstats
+
+    # Rollups are written by the scheduled abtest_results command, not on GET
+    results = abstats.compute_results(abstats.load_rollups())
+    for row in results["variants"]:
+        row["unique_visitors"] = abtesting.unique_visitors(row["variant"])
+
+    context = {"results": results}
+    return render(request, "accounts/abtest_results.html", context)
+
+
+def metrics_view(request):
+    """Prometheus metrics for every worker (see accounts/metrics.py)."""
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        # Never serve metrics unauthenticated in production
+        return HttpResponse("Not Found", status=404, content_type="text/plain")
+    if token and not constant_time_compare(
+        request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+    ):
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+
+    body, content_type = metrics.render_latest()
+    return HttpResponse(body, content_type=content_type)
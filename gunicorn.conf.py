@@ -0,0 +1,85 @@
+"""
+Gunicorn configuration for procrast_local.
+
+Set FAST_STARTUP=True to import (and optionally warm) the application once in
+the master with ``preload_app`` and fork ready-made workers from it. Database
+connections are closed before forking so no worker inherits the master's
+socket, and each worker opens a fresh connection as soon as it boots instead
+of on its first request.
+
+Workers share Prometheus metrics through files in PROMETHEUS_MULTIPROC_DIR
+(see accounts/metrics.py). The directory is emptied when gunicorn starts, so
+samples from a previous run don't carry over.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+FAST_STARTUP = os.environ.get("FAST_STARTUP", "False").lower() in ("1", "true", "yes")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Threaded workers, so a slow request doesn't hold up the whole worker;
+# ADMISSION_MAX_CONCURRENCY defaults to the same number
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = FAST_STARTUP
+
+# Set before the app (and prometheus_client) is imported in any process
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "procrast-metrics")
+)
+
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def _close_db_connections():
+    # Only touch Django once the app has been loaded (always true with preload)
+    from django.db import connections
+
+    connections.close_all()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # A connection opened in the master (e.g. by cache warming) must not be
+        # shared with the children; closing it here is safe, closing it in a
+        # child would tear down the master's session on the server too.
+        _close_db_connections()
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.monotonic()
+
+
+def post_worker_init(worker):
+    if FAST_STARTUP:
+        from django.db import connections
+
+        for conn in connections.all():
+            conn.ensure_connection()
+
+    elapsed = time.monotonic() - worker.boot_started
+    worker.log.info("Worker %s booted in %.1f ms", worker.pid, elapsed * 1000)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Persist the worker's unflushed A/B visitor sketches
+    from accounts.abtesting import flush_sketches_at_exit
+    from accounts.slowlog import report_at_exit
+
+    flush_sketches_at_exit()
+    # And log the slow queries it saw since its last report
+    report_at_exit()
@@ -4,8 +4,38 @@ URL configuration for procrast_local project.
 
 from django.contrib import admin
 from django.urls import include, path
+from django.urls.resolvers import RoutePattern, URLResolver
+from django.utils.functional import cached_property
+
+
+class LazyAdminURLConf:
+    """Admin URL patterns, built (and admin modules discovered) on first use."""
+
+    @cached_property
+    def urlpatterns(self):
+        # A no-op when AdminConfig has already autodiscovered at startup
+        admin.autodiscover()
+        return admin.site.get_urls()
+
+
+class LazyURLResolver(URLResolver):
+    """
+    A namespaced resolver that doesn't load its patterns when the root
+    resolver is populated for ``reverse()``/``{% url %}``. They load the first
+    time a path under its prefix is resolved or one of its names is reversed.
+    """
+
+    def _populate(self):
+        if "url_patterns" in self.__dict__:
+            super()._populate()
+
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
+    LazyURLResolver(
+        RoutePattern("admin/"),
+        LazyAdminURLConf(),
+        app_name="admin",
+        namespace=admin.site.name,
+    ),
     path("", include("accounts.urls")),
 ]
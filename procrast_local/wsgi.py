@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "procrast_local.settings")
 
 application = get_wsgi_application()
+
+# Imported after setup so the app registry is ready
+from accounts.caching import warm_caches_on_startup  # noqa: E402
+
+warm_caches_on_startup()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Benchmark response compression on the feed and leaderboard pages.
+
+Builds a throwaway test database, seeds it with posts and reactions, then
+requests each page with ``identity``, ``gzip`` and ``br`` Accept-Encoding.
+Reports the bytes on the wire, the median server time, and the estimated
+time to first byte plus transfer at a given link speed.
+
+Usage:
+    python scripts/benchmark_compression.py [--posts 200] [--runs 20] [--mbps 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_DEBUG", "True")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "procrast_local.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+)
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from accounts.models import Like, Post  # noqa: E402
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def seed(post_count):
+    users = User.objects.bulk_create(
+        User(username=f"bench{i}", email=f"bench{i}@example.com") for i in range(20)
+    )
+    posts = Post.objects.bulk_create(
+        Post(
+            title=f"Procrastination story {i}",
+            description="Reorganised my desk instead of writing the report. " * 5,
+            hours_procrastinated=random.randint(1, 40),
+            author=random.choice(users),
+        )
+        for i in range(post_count)
+    )
+    Like.objects.bulk_create(
+        (Like(user=user, post=post) for post in posts for user in users[:3]),
+        ignore_conflicts=True,
+    )
+    cache.clear()
+    return users[0]
+
+
+def measure(client, url, params, encoding, runs):
+    sizes, timings = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get(url, params, HTTP_ACCEPT_ENCODING=encoding)
+        timings.append(time.perf_counter() - started)
+        sizes.append(len(response.content))
+    return statistics.median(sizes), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--posts", type=int, default=200, help="Posts to seed.")
+    parser.add_argument("--runs", type=int, default=20, help="Requests per row.")
+    parser.add_argument(
+        "--mbps", type=float, default=5.0, help="Link speed for transfer estimates."
+    )
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        user = seed(args.posts)
+        client = Client()
+        client.force_login(user)
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        pages = [
+            ("home", reverse("home"), {}),
+            ("leaderboard", reverse("leaderboard"), {}),
+            ("user_leaderboard", reverse("user_leaderboard"), {}),
+            ("check_new_posts", reverse("check_new_posts"), {"since": since}),
+        ]
+        bytes_per_ms = args.mbps * 1_000_000 / 8 / 1000
+
+        print(
+            f"{'page':<18}{'encoding':<10}{'bytes':>9}{'saved':>8}"
+            f"{'server ms':>11}{'total ms':>10}{'saved ms':>10}"
+        )
+        for name, url, params in pages:
+            baseline = None
+            for encoding in ENCODINGS:
+                size, server_s = measure(client, url, params, encoding, args.runs)
+                total_ms = server_s * 1000 + size / bytes_per_ms
+                if baseline is None:
+                    baseline = (size, total_ms)
+                print(
+                    f"{name:<18}{encoding:<10}{size:>9.0f}"
+                    f"{1 - size / baseline[0]:>8.0%}{server_s * 1000:>11.2f}"
+                    f"{total_ms:>10.2f}{baseline[1] - total_ms:>10.2f}"
+                )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
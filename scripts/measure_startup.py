@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Measure per-worker boot time and first-request latency.
+
+Each run starts a fresh interpreter that does what a gunicorn worker does:
+import ``procrast_local.wsgi`` (boot), open its database connection the way
+``gunicorn.conf.py`` does in FAST_STARTUP mode, then send two requests
+straight to the WSGI callable. Runs are repeated in the default and the
+FAST_STARTUP configuration and summarised side by side.
+
+Usage:
+    python scripts/measure_startup.py [--runs 5] [--path /login/]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+from procrast_local.wsgi import application
+booted = time.perf_counter()
+
+connected = booted
+if {fast_startup!r}:
+    from django.db import connections
+    for conn in connections.all():
+        conn.ensure_connection()
+    connected = time.perf_counter()
+
+def request():
+    environ = {{"PATH_INFO": {path!r}, "REQUEST_METHOD": "GET"}}
+    setup_testing_defaults(environ)
+    began = time.perf_counter()
+    response = application(environ, lambda status, headers: None)
+    b"".join(response)
+    response.close()
+    return time.perf_counter() - began
+
+first = request()
+second = request()
+json.dump(
+    {{
+        "boot_ms": (booted - started) * 1000,
+        "connect_ms": (connected - booted) * 1000,
+        "first_request_ms": first * 1000,
+        "second_request_ms": second * 1000,
+    }},
+    sys.stdout,
+)
+"""
+
+METRICS = ("boot_ms", "connect_ms", "first_request_ms", "second_request_ms")
+
+
+def run_once(path, fast_startup):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_DEBUG", "True")
+    env.setdefault("DJANGO_SETTINGS_MODULE", "procrast_local.settings")
+    env["FAST_STARTUP"] = "True" if fast_startup else "False"
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(path=path, fast_startup=fast_startup)],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per mode.")
+    parser.add_argument("--path", default="/login/", help="Path to request.")
+    args = parser.parse_args()
+
+    print(f"{'mode':<14}{'metric':<20}{'median':>10}{'min':>10}{'max':>10}")
+    for label, fast_startup in (("default", False), ("fast-startup", True)):
+        runs = [run_once(args.path, fast_startup) for _ in range(args.runs)]
+        for metric in METRICS:
+            values = [run[metric] for run in runs]
+            print(
+                f"{label:<14}{metric:<20}{statistics.median(values):>10.1f}"
+                f"{min(values):>10.1f}{max(values):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Summarise ``python -X importtime`` for loading the WSGI application.
+
+Runs a fresh interpreter that imports ``procrast_local.wsgi`` with import-time
+tracing enabled, then totals the self time per top-level package (``django``,
+``accounts``, ``dj_database_url`` ...) and lists the slowest modules.
+
+Usage:
+    python scripts/profile_imports.py [--top 25] [--fast-startup]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# "import time:       123 |        456 |   module.name"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def collect(fast_startup):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_DEBUG", "True")
+    env.setdefault("DJANGO_SETTINGS_MODULE", "procrast_local.settings")
+    env["FAST_STARTUP"] = "True" if fast_startup else "False"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import procrast_local.wsgi"],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--top", type=int, default=25, help="Rows per table.")
+    parser.add_argument(
+        "--fast-startup",
+        action="store_true",
+        help="Profile with FAST_STARTUP=True (deferred admin).",
+    )
+    args = parser.parse_args()
+
+    modules = collect(args.fast_startup)
+    per_package = defaultdict(lambda: [0, 0])
+    for name, self_us, _ in modules:
+        totals = per_package[name.split(".")[0]]
+        totals[0] += self_us
+        totals[1] += 1
+    total_us = sum(self_us for _, self_us, _ in modules)
+
+    print(f"Imported {len(modules)} modules in {total_us / 1000:.1f} ms\n")
+    print(f"{'package':<32}{'self ms':>10}{'share':>8}{'modules':>9}")
+    ranked = sorted(per_package.items(), key=lambda item: -item[1][0])
+    for package, (self_us, count) in ranked[: args.top]:
+        share = self_us / total_us if total_us else 0
+        print(f"{package:<32}{self_us / 1000:>10.1f}{share:>8.1%}{count:>9}")
+
+    print(f"\n{'module':<56}{'self ms':>10}{'cumul ms':>10}")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[1])[
+        : args.top
+    ]:
+        print(f"{name:<56}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
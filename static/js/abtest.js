@@ -0,0 +1,44 @@
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const button = document.getElementById('abtest');
+    const variant = button.getAttribute('data-variant');
+    const trackUrl = button.getAttribute('data-track-url');
+    // The page is shared between visitors, so the token comes from the cookie
+    const csrfToken = getCookie('csrftoken');
+
+    button.addEventListener('click', function() {
+        // Track button click via AJAX
+        const formData = new FormData();
+        formData.append('variant', variant);
+        formData.append('csrfmiddlewaretoken', csrfToken);
+
+        fetch(trackUrl, {
+            method: 'POST',
+            body: formData,
+            headers: {
+                'X-CSRFToken': csrfToken
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            console.log('Button click tracked:', data);
+        })
+        .catch(error => {
+            console.error('Error tracking button click:', error);
+        });
+    });
+});
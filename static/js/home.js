@@ -0,0 +1,360 @@
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+function toggleLike(postId) {
+    const btn = document.querySelector(`[data-post-id="${postId}"].like-btn`);
+    const dislikeBtn = document.querySelector(`[data-post-id="${postId}"].dislike-btn`);
+    const likeCountEl = document.getElementById(`like-count-${postId}`);
+    const dislikeCountEl = document.getElementById(`dislike-count-${postId}`);
+    const likeText = btn.querySelector('.like-text');
+    const dislikeText = dislikeBtn.querySelector('.dislike-text');
+
+    // Disable buttons during request
+    btn.disabled = true;
+    dislikeBtn.disabled = true;
+
+    const csrftoken = getCookie('csrftoken');
+
+    fetch(`/like-post/${postId}/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'Content-Type': 'application/json',
+        },
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            alert('Error: ' + data.error);
+            btn.disabled = false;
+            dislikeBtn.disabled = false;
+            return;
+        }
+
+        // Update counts
+        likeCountEl.textContent = data.like_count;
+        dislikeCountEl.textContent = data.dislike_count;
+
+        // Update button states - ensure mutual exclusivity
+        if (data.liked) {
+            btn.classList.add('liked');
+            likeText.textContent = 'Unlike';
+            // Ensure dislike button is not active
+            dislikeBtn.classList.remove('disliked');
+            dislikeText.textContent = 'Dislike';
+        } else {
+            btn.classList.remove('liked');
+            likeText.textContent = 'Like';
+            // Ensure dislike button is not active (in case it was)
+            dislikeBtn.classList.remove('disliked');
+            dislikeText.textContent = 'Dislike';
+        }
+
+        btn.disabled = false;
+        dislikeBtn.disabled = false;
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred. Please try again.');
+        btn.disabled = false;
+        dislikeBtn.disabled = false;
+    });
+}
+
+function toggleDislike(postId) {
+    const btn = document.querySelector(`[data-post-id="${postId}"].dislike-btn`);
+    const likeBtn = document.querySelector(`[data-post-id="${postId}"].like-btn`);
+    const likeCountEl = document.getElementById(`like-count-${postId}`);
+    const dislikeCountEl = document.getElementById(`dislike-count-${postId}`);
+    const dislikeText = btn.querySelector('.dislike-text');
+    const likeText = likeBtn.querySelector('.like-text');
+
+    // Disable buttons during request
+    btn.disabled = true;
+    likeBtn.disabled = true;
+
+    const csrftoken = getCookie('csrftoken');
+
+    fetch(`/dislike-post/${postId}/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'Content-Type': 'application/json',
+        },
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.error) {
+            alert('Error: ' + data.error);
+            btn.disabled = false;
+            likeBtn.disabled = false;
+            return;
+        }
+
+        // Update counts
+        likeCountEl.textContent = data.like_count;
+        dislikeCountEl.textContent = data.dislike_count;
+
+        // Update button states - ensure mutual exclusivity
+        if (data.disliked) {
+            btn.classList.add('disliked');
+            dislikeText.textContent = 'Undislike';
+            // Ensure like button is not active
+            likeBtn.classList.remove('liked');
+            likeText.textContent = 'Like';
+        } else {
+            btn.classList.remove('disliked');
+            dislikeText.textContent = 'Dislike';
+            // Ensure like button is not active (in case it was)
+            likeBtn.classList.remove('liked');
+            likeText.textContent = 'Like';
+        }
+
+        btn.disabled = false;
+        likeBtn.disabled = false;
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred. Please try again.');
+        btn.disabled = false;
+        likeBtn.disabled = false;
+    });
+}
+
+// Auto-refresh functionality
+let lastCheckTime = new Date().toISOString();
+let refreshInterval;
+
+function checkForNewPosts() {
+    const indicator = document.getElementById('refresh-indicator');
+    indicator.style.display = 'block';
+
+    // Only show new posts that belong in the feed being viewed
+    const container = document.getElementById('posts-container');
+    const feed = container.dataset.feed;
+    const tag = container.dataset.tag;
+    const tagParam = tag ? `&tag=${encodeURIComponent(tag)}` : '';
+    fetch(`/check-new-posts/?since=${encodeURIComponent(lastCheckTime)}&feed=${feed}${tagParam}`)
+        .then(response => response.json())
+        .then(data => {
+            indicator.style.display = 'none';
+
+            if (data.count > 0) {
+                // Update last check time to the most recent post
+                if (data.new_posts.length > 0) {
+                    lastCheckTime = data.new_posts[0].created_at;
+                }
+
+                // Prepend new posts to the feed
+                const container = document.getElementById('posts-container');
+                data.new_posts.forEach(post => {
+                    const postHtml = createPostElement(post);
+                    container.insertBefore(postHtml, container.firstChild);
+                });
+
+                // Show notification
+                if (data.count > 0) {
+                    const notification = document.createElement('div');
+                    notification.style.cssText = 'position: fixed; top: 20px; right: 20px; background: #28a745; color: white; padding: 15px 20px; border-radius: 8px; box-shadow: 0 4px 12px rgba(0,0,0,0.2); z-index: 1000;';
+                    notification.textContent = `✨ ${data.count} new post${data.count > 1 ? 's' : ''}!`;
+                    document.body.appendChild(notification);
+
+                    setTimeout(() => {
+                        notification.remove();
+                    }, 3000);
+                }
+            }
+        })
+        .catch(error => {
+            console.error('Error checking for new posts:', error);
+            indicator.style.display = 'none';
+        });
+}
+
+function createPostElement(post) {
+    const div = document.createElement('div');
+    div.className = 'post-card';
+    div.id = `post-${post.id}`;
+    div.innerHTML = `
+        <div class="post-header">
+            <h3 class="post-title">${escapeHtml(post.title)}</h3>
+            <span class="post-author">@${escapeHtml(post.author)}</span>
+        </div>
+        <div class="post-description">${escapeHtml(post.description)}</div>
+        ${tagChips(post.tags)}
+        <div class="post-meta">
+            <div class="post-hours">
+                <strong>⏰ ${post.hours_procrastinated} hours</strong> procrastinated
+            </div>
+            <div style="display: flex; align-items: center; gap: 20px;">
+                <span class="post-date">${formatDate(post.created_at)}</span>
+                <div class="like-section">
+                    <div class="vote-buttons">
+                        <button class="like-btn" data-post-id="${post.id}" onclick="toggleLike(${post.id})">
+                            <span>❤️</span>
+                            <span class="like-text">Like</span>
+                        </button>
+                        <span class="like-count" id="like-count-${post.id}">${post.like_count}</span>
+                    </div>
+                    <div class="vote-buttons">
+                        <button class="dislike-btn" data-post-id="${post.id}" onclick="toggleDislike(${post.id})">
+                            <span>👎</span>
+                            <span class="dislike-text">Dislike</span>
+                        </button>
+                        <span class="dislike-count" id="dislike-count-${post.id}">${post.dislike_count}</span>
+                    </div>
+                </div>
+                <span class="comment-count" title="Comments">💬 ${post.comment_count || 0}</span>
+                <button class="similar-btn" onclick="toggleSimilar(${post.id})">Similar</button>
+            </div>
+        </div>
+        <div class="similar-panel" id="similar-${post.id}" style="display: none;"></div>
+    `;
+    return div;
+}
+
+function toggleSimilar(postId) {
+    const panel = document.getElementById(`similar-${postId}`);
+    if (panel.style.display !== 'none') {
+        panel.style.display = 'none';
+        return;
+    }
+    panel.style.display = 'block';
+    if (panel.dataset.loaded) {
+        return;
+    }
+    panel.textContent = 'Loading...';
+
+    fetch(`/similar-posts/${postId}/`)
+        .then(response => response.json())
+        .then(data => {
+            panel.dataset.loaded = 'true';
+            if (!data.similar || data.similar.length === 0) {
+                panel.textContent = 'No similar posts yet.';
+                return;
+            }
+            const items = data.similar.map(post => `
+                <li>
+                    <span class="similar-title">${escapeHtml(post.title)}</span>
+                    <a href="/users/${encodeURIComponent(post.author)}/" class="post-author">@${escapeHtml(post.author)}</a>
+                    <span class="similar-hours">⏰ ${post.hours_procrastinated}h</span>
+                </li>
+            `);
+            panel.innerHTML = `<h4>Similar posts</h4><ul>${items.join('')}</ul>`;
+        })
+        .catch(error => {
+            console.error('Error loading similar posts:', error);
+            panel.textContent = 'Could not load similar posts.';
+        });
+}
+
+function tagChips(tags) {
+    if (!tags || tags.length === 0) {
+        return '';
+    }
+    const chips = tags.map(name =>
+        `<a href="?tag=${encodeURIComponent(name)}" class="tag-chip">#${escapeHtml(name)}</a>`
+    );
+    return `<div class="post-tags">${chips.join('')}</div>`;
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function formatDate(isoString) {
+    const date = new Date(isoString);
+    return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric', year: 'numeric', hour: '2-digit', minute: '2-digit' });
+}
+
+function getVisiblePostIds() {
+    const ids = [];
+    document.querySelectorAll('.post-card').forEach(card => {
+        const rect = card.getBoundingClientRect();
+        if (rect.bottom > 0 && rect.top < window.innerHeight) {
+            ids.push(card.id.replace('post-', ''));
+        }
+    });
+    return ids.slice(0, 100);
+}
+
+function setReaction(postId, reaction) {
+    const likeBtn = document.querySelector(`[data-post-id="${postId}"].like-btn`);
+    const dislikeBtn = document.querySelector(`[data-post-id="${postId}"].dislike-btn`);
+    if (!likeBtn || !dislikeBtn) {
+        return;
+    }
+    likeBtn.classList.toggle('liked', reaction === 1);
+    likeBtn.querySelector('.like-text').textContent = reaction === 1 ? 'Unlike' : 'Like';
+    dislikeBtn.classList.toggle('disliked', reaction === -1);
+    dislikeBtn.querySelector('.dislike-text').textContent = reaction === -1 ? 'Undislike' : 'Dislike';
+}
+
+// Refresh the counts of every visible post with one batched request
+function refreshVisibleCounts() {
+    const ids = getVisiblePostIds();
+    if (ids.length === 0) {
+        return;
+    }
+
+    fetch(`/post-counts/?ids=${ids.join(',')}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                return;
+            }
+            Object.entries(data.counts).forEach(([postId, values]) => {
+                const [likeCount, dislikeCount, reaction] = values;
+                document.getElementById(`like-count-${postId}`).textContent = likeCount;
+                document.getElementById(`dislike-count-${postId}`).textContent = dislikeCount;
+                setReaction(Number(postId), reaction);
+            });
+        })
+        .catch(error => {
+            console.error('Error refreshing counts:', error);
+        });
+}
+
+// Start auto-refresh when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    // Set initial last check time to now (we'll check for posts created after this)
+    lastCheckTime = new Date().toISOString();
+
+    // Check for new posts and refresh visible counts every 10 seconds. New
+    // posts belong on the first page, not on older ones
+    const olderPage = new URLSearchParams(window.location.search).has('cursor');
+    refreshInterval = setInterval(function() {
+        if (!olderPage) {
+            checkForNewPosts();
+        }
+        refreshVisibleCounts();
+    }, 10000);
+});
+
+// Catch up in one request when the tab comes back into view
+document.addEventListener('visibilitychange', function() {
+    if (document.visibilityState === 'visible') {
+        refreshVisibleCounts();
+    }
+});
+
+// Clean up interval when page unloads
+window.addEventListener('beforeunload', function() {
+    if (refreshInterval) {
+        clearInterval(refreshInterval);
+    }
+});
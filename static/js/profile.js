@@ -0,0 +1,47 @@
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+function toggleFollow() {
+    const btn = document.getElementById('follow-btn');
+    const followerCountEl = document.getElementById('follower-count');
+
+    // Disable the button during the request
+    btn.disabled = true;
+
+    fetch(`/users/${encodeURIComponent(btn.dataset.username)}/follow/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Content-Type': 'application/json',
+        },
+    })
+    .then(response => response.json())
+    .then(data => {
+        btn.disabled = false;
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+
+        btn.classList.toggle('following', data.following);
+        btn.textContent = data.following ? 'Unfollow' : 'Follow';
+        followerCountEl.textContent = data.follower_count;
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('An error occurred. Please try again.');
+        btn.disabled = false;
+    });
+}